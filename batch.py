@@ -0,0 +1,167 @@
+import json
+import time
+from random import Random
+from elevator import Simulation
+from logger import Logger, SILENT
+from cache import ResultCache, cache_key
+from profiling import Profiler
+from export import Exporter
+from snapshot import Snapshots, load, fork
+from streams import Streams
+from traffic import trip_source
+from traces import record_trace
+from constants import FLOORS, ELEVATORS, PEOPLE, ALGORITHIM, DWELL, PROFILE, BANKS, CAPACITY, FLOOR_DELAY, DOOR_DELAY, probability_spec
+
+# Keys a per-run config line may set, with their defaults
+CONFIG_KEYS = {
+    'floors': FLOORS,
+    'elevators': ELEVATORS,
+    'people': PEOPLE,
+    'algorithm': ALGORITHIM,
+    'dwell': DWELL,
+    'profile': PROFILE,
+    'banks': BANKS,
+    'capacity': CAPACITY,
+    'floor_delay': FLOOR_DELAY,
+    'door_delay': DOOR_DELAY,
+}
+
+def simulate(config, seed, log=SILENT, max_events=None, cache=None, profiler=None, exporter=None, snapshots=None):
+    # Run one headless simulation and return its result record. With a
+    # ResultCache the stored record of an identical run is returned instead,
+    # marked "cached", and finished runs are stored. A Profiler or Exporter,
+    # if given, instruments the run (and the cache is not read, so the run happens).
+    # snapshots: (every ms, path) to checkpoint the run to, see snapshot.Snapshots
+    instrumented = profiler is not None or exporter is not None or snapshots is not None
+    if cache is not None and not instrumented:
+        key = cache_key(config, seed, max_events)
+        record = cache.get(key)
+        if record is not None:
+            record["cached"] = True
+            return record
+    start = time.perf_counter()
+    sim = Simulation(config['floors'], config['elevators'], config['people'], config['algorithm'], seed, log, dwell=config['dwell'], profile=config['profile'],
+                     banks=config.get('banks', BANKS), **cars(config))
+    exporter and exporter.attach(sim)
+    snapshots and Snapshots(sim, *snapshots).start()
+    try:
+        processed = profiler.run(sim, max_events) if profiler else sim.run(max_events)
+    finally:
+        exporter and exporter.close()
+    record = result(sim, config, seed, processed, time.perf_counter() - start)
+    cache is not None and not instrumented and record["completed"] and cache.put(key, record)
+    return record
+
+def cars(config):
+    # Car keyword arguments of a Simulation; records written before these keys existed hold the defaults
+    return {key: config.get(key, CONFIG_KEYS[key]) for key in ('capacity', 'floor_delay', 'door_delay')}
+
+def result(sim, config, seed, processed, wall_time):
+    building = sim.building
+    return {
+        "config": config,
+        "seed": seed,
+        "wall_time": wall_time,
+        "events": processed,
+        "virtual_time": building.events.now(),
+        "completed": building.inside == 0 and len(sim.events) == 0,
+        "metrics": sim.metrics.summary(building.events.now()),
+        "passengers": passenger_records(building.passengers),
+    }
+
+def resume(path, algorithms=None, out=None, max_events=None):
+    # Finish the run saved in a snapshot, or with `algorithms` one branch of
+    # it per algorithm; writes one result record each and returns the exit status
+    status = 0
+    sink = open(out, "w") if out else None
+    try:
+        for algorithm in algorithms or [None]:
+            start = time.perf_counter()
+            sim = fork(path, algorithm) if algorithm else load(path)
+            processed = sim.run(max_events)
+            record = result(sim, sim.config, sim.seed, processed, time.perf_counter() - start)
+            status = status or (0 if record["completed"] else 1)
+            line = json.dumps(record)
+            if sink:
+                sink.write(line + "\n")
+            else:
+                print(line)
+    finally:
+        sink and sink.close()
+    return status
+
+def record_arrivals(path, profile, floors, people, seed=None):
+    # Write the arrivals a run with this profile and seed would see to a trace
+    source = trip_source(profile, probability_spec(floors), floors, people, Streams(seed).generator('arrivals'))
+    return record_trace(path, source, people)
+
+def passenger_records(people):
+    waits = [[] for _ in range(len(people))]
+    rides = [[] for _ in range(len(people))]
+    for passenger, wait, ride in zip(people.trip_passenger, people.trip_wait, people.trip_ride):
+        waits[passenger].append(wait)
+        rides[passenger].append(ride)
+    return [{"id": i, "wait": waits[i], "ride": rides[i]} for i in range(len(people))]
+
+def load_configs(path):
+    # One JSON object per line; keys outside CONFIG_KEYS/runs/seed are ignored
+    configs = []
+    with open(path) as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            entry = json.loads(line)
+            config = {key: entry.get(key, default) for key, default in CONFIG_KEYS.items()}
+            configs.append((config, entry.get('runs'), entry.get('seed')))
+    return configs
+
+def run_batch(configs, runs=1, seed=None, out=None, verbose=False, max_events=None, cache=None, profile=None, profile_out="profile",
+              export=None, export_format="parquet", snapshot_every=None, snapshot="snapshot-{n}.snap"):
+    # configs: list of (config, runs, seed); None falls back to the batch-wide value.
+    # cache: path of a ResultCache to reuse and store results in, or None.
+    # profile: profiling mode for every run; run n writes <profile_out>-<n>.*
+    # export: prefix of columnar exports; run n writes <export>-<n>-events/trips.<export_format>
+    # snapshot_every: ms of virtual time between checkpoints of each run to `snapshot` ({n} is the run)
+    # Returns the process exit status: 0 if every run finished with all passengers delivered.
+    seeds = Random(seed)
+    status = 0
+    count = 0
+    sink = open(out, "w") if out else None
+    cache = cache and ResultCache(cache)
+    try:
+        for config, config_runs, config_seed in configs:
+            for i in range(config_runs or runs):
+                if config_seed is not None:
+                    run_seed = config_seed + i
+                elif seed is not None:
+                    run_seed = seeds.randrange(2 ** 32)
+                else:
+                    run_seed = Random().randrange(2 ** 32)
+                profiler = profile and Profiler(profile)
+                snapshots = snapshot_every and (snapshot_every, snapshot.replace("{n}", str(count)))
+                # verbose runs log to log.txt, and to the console only when records go to a file
+                log = Logger(console=bool(sink)) if verbose else SILENT
+                try:
+                    exporter = export and Exporter("{}-{}".format(export, count), export_format)
+                    record = simulate(config, run_seed, log, max_events, cache, profiler, exporter, snapshots)
+                except Exception as e:
+                    record = {"config": config, "seed": run_seed, "error": repr(e)}
+                finally:
+                    log.close()
+                if profiler:
+                    record["profile"] = profiler.summary()
+                    profiler.write("{}-{}".format(profile_out, count))
+                count += 1
+                if record.get("error") or not record["completed"]:
+                    status = 1
+                line = json.dumps(record)
+                if sink:
+                    sink.write(line + "\n")
+                    sink.flush()
+                else:
+                    print(line)
+    finally:
+        sink and sink.close()
+        cache and cache.close()
+    return status
@@ -0,0 +1,158 @@
+import os
+import sys
+import json
+import time
+import argparse
+import platform
+import resource
+import subprocess
+import multiprocessing
+from elevator import Simulation
+from logger import SILENT
+from metrics import Histogram
+from dispatch import STRATEGIES
+
+# usage: python benchmark.py [--suite quick|full] [-a ALGORITHM ...] [--repeat 3] [--save] [--compare] [--threshold 0.1]
+# Every case runs in a fresh process, so peak memory is that run's alone, and
+# is repeated; like timeit, the fastest repeat is kept as the least noisy.
+# Results are written asv-style (one JSON document per run of the suite) and
+# can be saved as the baseline that later runs are checked against.
+
+# (floors, elevators, people)
+SUITES = {
+    'quick': [(5, 1, 100), (20, 4, 2000), (50, 8, 10000)],
+    'full': [(5, 1, 10), (20, 4, 1000), (50, 8, 10000), (100, 16, 100000), (200, 32, 1000000)],
+}
+
+BASELINE = os.path.join(".benchmarks", "baseline.json")
+HOUR = 3600 * 1000                        # ms
+
+# metric -> True when higher is better
+METRICS = {
+    'events_per_second': True,
+    'wall_per_sim_hour': False,
+    'peak_memory_mb': False,
+    'dispatch_p50_us': False,
+    'dispatch_p99_us': False,
+}
+
+class TimedDispatch(object):
+    # Stands in for a bank's handle_call_logic and records each decision's latency
+    def __init__(self, logic, latency):
+        self.logic = logic
+        self.latency = latency            # Histogram (ns) shared by every bank
+
+    def __call__(self, floor, direction, now):
+        start = time.perf_counter_ns()
+        handled = self.logic(floor, direction, now)
+        self.latency.add(time.perf_counter_ns() - start)
+        return handled
+
+def run_case(floors, elevators, people, algorithm, seed):
+    sim = Simulation(floors, elevators, people, algorithm, seed, SILENT)
+    latency = Histogram()
+    for bank in sim.elevators.banks:
+        bank.handle_call_logic = TimedDispatch(bank.handle_call_logic, latency)
+    start = time.perf_counter()
+    processed = sim.run()
+    wall = time.perf_counter() - start
+    virtual = sim.events.now()
+    return {
+        'events': processed,
+        'wall_time': wall,
+        'virtual_time': virtual,
+        'events_per_second': processed / wall if wall else None,
+        'wall_per_sim_hour': wall / (virtual / HOUR) if virtual else None,
+        # ru_maxrss is KiB on Linux, bytes on macOS
+        'peak_memory_mb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / (1024 * 1024 if sys.platform == 'darwin' else 1024),
+        'dispatch_calls': latency.count,
+        'dispatch_p50_us': latency.percentile(50) / 1000 if latency.count else None,
+        'dispatch_p99_us': latency.percentile(99) / 1000 if latency.count else None,
+    }
+
+def case_name(floors, elevators, people, algorithm):
+    return "{}f-{}e-{}p-{}".format(floors, elevators, people, algorithm)
+
+def commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True).stdout.strip() or None
+    except OSError:
+        return None
+
+def run_suite(cases, algorithms, seed=0, repeat=3, verbose=True):
+    context = multiprocessing.get_context("spawn")
+    results = {}
+    with context.Pool(1, maxtasksperchild=1) as pool:
+        for floors, elevators, people in cases:
+            for algorithm in algorithms:
+                name = case_name(floors, elevators, people, algorithm)
+                runs = [pool.apply(run_case, (floors, elevators, people, algorithm, seed)) for _ in range(repeat)]
+                results[name] = min(runs, key=lambda run: run['wall_time'])
+                verbose and print(report_line(name, results[name]), flush=True)
+    return {
+        'commit': commit(),
+        'date': time.strftime("%Y-%m-%dT%H:%M:%S"),
+        'machine': {'platform': platform.platform(), 'python': platform.python_version(), 'cpus': os.cpu_count()},
+        'seed': seed,
+        'repeat': repeat,
+        'results': results,
+    }
+
+def report_line(name, result):
+    p50 = result['dispatch_p50_us']
+    return "{:<32} {:>12,.0f} ev/s {:>9.3f} s/sim-h {:>8.1f} MB  dispatch p50 {} us".format(
+        name, result['events_per_second'] or 0, result['wall_per_sim_hour'] or 0, result['peak_memory_mb'],
+        "-" if p50 is None else "{:.1f}".format(p50))
+
+def regressions(current, baseline, threshold=0.1):
+    # (case, metric, baseline, current, relative change) for every metric that
+    # got worse by more than `threshold` in a case both runs measured
+    found = []
+    for name, result in current['results'].items():
+        before = baseline['results'].get(name)
+        if before is None:
+            continue
+        for metric, higher_is_better in METRICS.items():
+            old, new = before.get(metric), result.get(metric)
+            if not old or new is None:
+                continue
+            change = (new - old) / old
+            if (-change if higher_is_better else change) > threshold:
+                found.append((name, metric, old, new, change))
+    return found
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--suite", choices=list(SUITES), default="quick", help="Building sizes to run (full goes up to 200 floors, 32 cars, 10^6 people)")
+    parser.add_argument("-a", "--algorithm", nargs="+", default=list(STRATEGIES), help="Algorithms, all registered ones by default")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--repeat", type=int, default=3, help="Runs per case; the fastest is kept")
+    parser.add_argument("--out", type=str, help="Write this run's results (JSON)")
+    parser.add_argument("--baseline", type=str, default=BASELINE, help="Baseline file")
+    parser.add_argument("--save", action="store_true", help="Store this run as the baseline")
+    parser.add_argument("--compare", action="store_true", help="Check this run against the baseline")
+    parser.add_argument("--threshold", type=float, default=0.1, help="Relative change that counts as a regression")
+    args = parser.parse_args()
+
+    current = run_suite(SUITES[args.suite], args.algorithm, args.seed, args.repeat)
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump(current, f, indent=1)
+    status = 0
+    if args.compare:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        found = regressions(current, baseline, args.threshold)
+        for name, metric, old, new, change in found:
+            print("REGRESSION {} {}: {:.4g} -> {:.4g} ({:+.1%})".format(name, metric, old, new, change))
+        print("{} regressions against baseline {} ({})".format(len(found), baseline.get('commit'), args.baseline))
+        status = 1 if found else 0
+    if args.save:
+        directory = os.path.dirname(args.baseline)
+        directory and os.makedirs(directory, exist_ok=True)
+        with open(args.baseline, "w") as f:
+            json.dump(current, f, indent=1)
+    return status
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,108 @@
+import os
+import json
+import time
+import zlib
+import sqlite3
+import hashlib
+from constants import probability_spec, PROFILE
+from traffic import describe
+
+CACHE_PATH = os.path.join(".cache", "results.sqlite")
+CACHE_SIZE = 256 * 1024 * 1024           # bytes of stored results before the least recently used go
+
+# Modules whose code decides what a run produces; editing any of them changes
+# every key, so stale results are never served (they age out through LRU)
+SOURCES = ('elevator', 'dispatch', 'events', 'stops', 'trips', 'traffic', 'traces', 'streams', 'metrics', 'constants', 'batch', 'zones')
+
+def code_version(root=os.path.dirname(os.path.abspath(__file__))):
+    digest = hashlib.sha256()
+    for name in SOURCES:
+        with open(os.path.join(root, name + ".py"), "rb") as f:
+            digest.update(f.read())
+    return digest.hexdigest()
+
+VERSION = code_version()
+
+def cache_key(config, seed, max_events=None):
+    # Canonical hash of everything that determines a run's result
+    spec = {
+        "config": config,
+        "seed": seed,
+        "max_events": max_events,
+        "probability": probability_spec(config['floors']),
+        "traffic": describe(config.get('profile', PROFILE)),
+        "version": VERSION,
+    }
+    return hashlib.sha256(json.dumps(spec, sort_keys=True, separators=(",", ":")).encode()).hexdigest()
+
+class ResultCache(object):
+    # Persistent result store shared by every process of a sweep.
+    # Records (and optional event traces) are kept zlib-compressed in SQLite,
+    # whose locking makes concurrent readers and writers safe; WAL mode lets
+    # readers go on while a worker writes. Every hit refreshes the entry's
+    # last use, and once the stored bytes pass `max_bytes` the least recently
+    # used entries are dropped.
+    def __init__(self, path=CACHE_PATH, max_bytes=CACHE_SIZE):
+        self.path = path
+        self.max_bytes = max_bytes
+        directory = os.path.dirname(path)
+        directory and os.makedirs(directory, exist_ok=True)
+        self.db = sqlite3.connect(path, timeout=60, isolation_level=None)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("""CREATE TABLE IF NOT EXISTS results (
+            key TEXT PRIMARY KEY,
+            record BLOB NOT NULL,
+            trace BLOB,
+            size INTEGER NOT NULL,
+            used REAL NOT NULL)""")
+        self.db.execute("CREATE INDEX IF NOT EXISTS results_used ON results (used)")
+
+    def __len__(self):
+        return self.db.execute("SELECT COUNT(*) FROM results").fetchone()[0]
+
+    def __contains__(self, key):
+        return self.db.execute("SELECT 1 FROM results WHERE key = ?", (key,)).fetchone() is not None
+
+    def get(self, key, trace=False):
+        # The stored record, or None; with trace=True a (record, trace bytes) pair
+        row = self.db.execute("SELECT record, trace FROM results WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            return (None, None) if trace else None
+        self.db.execute("UPDATE results SET used = ? WHERE key = ?", (time.time(), key))
+        record = json.loads(zlib.decompress(row[0]))
+        if trace:
+            return record, row[1] and zlib.decompress(row[1])
+        return record
+
+    def put(self, key, record, trace=None):
+        blob = zlib.compress(json.dumps(record).encode())
+        trace = trace and zlib.compress(trace)
+        size = len(blob) + (len(trace) if trace else 0)
+        self.db.execute("INSERT OR REPLACE INTO results (key, record, trace, size, used) VALUES (?, ?, ?, ?, ?)",
+                        (key, blob, trace, size, time.time()))
+        self.evict()
+
+    def size(self):
+        return self.db.execute("SELECT COALESCE(SUM(size), 0) FROM results").fetchone()[0]
+
+    def evict(self):
+        excess = self.size() - self.max_bytes
+        if excess <= 0:
+            return
+        self.db.execute("BEGIN IMMEDIATE")
+        try:
+            for key, size in self.db.execute("SELECT key, size FROM results ORDER BY used").fetchall():
+                if excess <= 0:
+                    break
+                self.db.execute("DELETE FROM results WHERE key = ?", (key,))
+                excess -= size
+            self.db.execute("COMMIT")
+        except BaseException:
+            self.db.execute("ROLLBACK")
+            raise
+
+    def clear(self):
+        self.db.execute("DELETE FROM results")
+
+    def close(self):
+        self.db.close()
@@ -0,0 +1,106 @@
+import json
+import time
+import numpy as np
+from elevator import Simulation
+from logger import SILENT
+from batch import result, cars
+from streams import Streams
+from traffic import trip_source, is_trace
+from traces import open_trace
+from trips import CHUNK_SIZE
+from constants import DWELL, BANKS, CAPACITY, FLOOR_DELAY, DOOR_DELAY, probability_spec
+
+def arrivals(config, seed):
+    # The arrival stream of a config as one array: the memory map of a trace,
+    # or the trips a run of this config and seed would generate
+    profile = config['profile']
+    if is_trace(profile):
+        return open_trace(profile)
+    floors, people = config['floors'], config['people']
+    source = trip_source(profile, probability_spec(floors), floors, people, Streams(seed).generator('arrivals'))
+    chunks = []
+    drawn = 0
+    while drawn < people:
+        chunk = source.next_chunk(people - drawn)
+        if chunk is None:
+            break
+        chunks.append(chunk.copy())
+        drawn += len(chunk)
+    return np.concatenate(chunks) if chunks else source.generate(0)
+
+def compare(config, algorithms, seed=0, max_events=None):
+    # Run one config under several dispatch algorithms side by side in this
+    # process. The arrivals are generated (or mapped) once and every run
+    # reads the same array, so each gets exactly the trips a standalone run
+    # with this seed would get. Runs advance in lockstep, CHUNK_SIZE arrivals
+    # at a time, so a memory-mapped trace is paged in once for all of them.
+    # max_events is a budget per run. Returns one result record per algorithm.
+    trips = arrivals(config, seed)
+    runs = []
+    for algorithm in algorithms:
+        run_config = dict(config, algorithm=algorithm, people=len(trips))
+        start = time.perf_counter()
+        sim = Simulation(config['floors'], config['elevators'], len(trips), algorithm, seed, SILENT,
+                         dwell=config['dwell'], profile=config['profile'], arrivals=trips,
+                         banks=config.get('banks', BANKS), **cars(config))
+        sim.building.simulate()
+        runs.append([sim, run_config, time.perf_counter() - start])
+    windows = trips['time'][CHUNK_SIZE::CHUNK_SIZE].tolist() + [None]
+    for until in windows:
+        for run in runs:
+            start = time.perf_counter()
+            run[0].events.run(until=until, max_events=max_events)
+            run[2] += time.perf_counter() - start
+    return [result(sim, run_config, seed, sim.events.processed, wall_time) for sim, run_config, wall_time in runs]
+
+def replay(path, algorithms, floors, elevators, seed=0, dwell=DWELL, banks=BANKS, capacity=CAPACITY,
+           floor_delay=FLOOR_DELAY, door_delay=DOOR_DELAY):
+    # Replay one arrival trace through every algorithm
+    config = {'floors': floors, 'elevators': elevators, 'people': 0, 'dwell': dwell, 'profile': path, 'banks': banks,
+              'capacity': capacity, 'floor_delay': floor_delay, 'door_delay': door_delay}
+    return compare(config, algorithms, seed)
+
+# Rows of the comparison table: (label, function of a record)
+ROWS = [
+    ("trips", lambda r: r["metrics"]["trips"]),
+    ("wait mean (s)", lambda r: r["metrics"]["wait"]["mean"]),
+    ("wait p50 (s)", lambda r: r["metrics"]["wait"]["p50"]),
+    ("wait p95 (s)", lambda r: r["metrics"]["wait"]["p95"]),
+    ("wait p99 (s)", lambda r: r["metrics"]["wait"]["p99"]),
+    ("wait max (s)", lambda r: r["metrics"]["wait"]["max"]),
+    ("ride mean (s)", lambda r: r["metrics"]["ride"]["mean"]),
+    ("ride p95 (s)", lambda r: r["metrics"]["ride"]["p95"]),
+    ("utilization", lambda r: np.mean(r["metrics"]["utilization"])),
+    ("load factor", lambda r: np.mean(r["metrics"]["load_factor"])),
+    ("completed", lambda r: r["completed"]),
+    ("wall time (s)", lambda r: r["wall_time"]),
+]
+
+def cell(label, value):
+    if value is None:
+        return "-"
+    if isinstance(value, (bool, np.bool_)):
+        return "yes" if value else "no"
+    if label.endswith("(s)") and label != "wall time (s)":
+        value = value / 1000.0
+    if isinstance(value, (int, np.integer)):
+        return str(value)
+    return "{:.3f}".format(value) if abs(value) < 10 else "{:.1f}".format(value)
+
+def table(records):
+    # Side-by-side metrics, one column per algorithm
+    header = [""] + [record["config"]["algorithm"] for record in records]
+    lines = [header] + [[label] + [cell(label, value(record)) for record in records] for label, value in ROWS]
+    widths = [max(len(line[i]) for line in lines) for i in range(len(header))]
+    return "\n".join("  ".join(text.ljust(width) if i == 0 else text.rjust(width) for i, (text, width) in enumerate(zip(line, widths))) for line in lines)
+
+def run_compare(config, algorithms, seed=0, out=None, max_events=None):
+    # CLI entry point; prints the table, writes the records to `out`, and
+    # returns the process exit status
+    records = compare(config, algorithms, seed, max_events)
+    print(table(records))
+    if out:
+        with open(out, "w") as sink:
+            for record in records:
+                sink.write(json.dumps(record) + "\n")
+    return 0 if all(record["completed"] for record in records) else 1
@@ -1,21 +1,39 @@
-import asyncio
-
 FLOORS = 5
 ELEVATORS = 2
 PEOPLE = 10
 STAR_FLOOR = 1
-PROBABILITY = {
-    'min': 1,
-    'max': FLOORS,
-    'step': 1,
-    'probability': [{
-        'value': 1,
-        'probability': 0.8
-    }] + [{
-        'value': x,
-        'probability': 0.2 / ((FLOORS - 1) ^ 2) * (x - 1) * (FLOORS - x)
-    } for x in range(2, FLOORS)]
-}
-LOOP = asyncio.get_event_loop()
+
+def probability_spec(floors):
+    return {
+        'min': 1,
+        'max': floors,
+        'step': 1,
+        'probability': [{
+            'value': 1,
+            'probability': 0.8
+        }] + [{
+            'value': x,
+            'probability': 0.2 / ((floors - 1) ** 2) * (x - 1) * (floors - x)
+        } for x in range(2, floors)]
+    }
+
+PROBABILITY = probability_spec(FLOORS)
 ALGORITHIM = "random"
-VERBOSE = False
\ No newline at end of file
+PROFILE = "static"                        # arrivals, see traffic.py
+DWELL = "uniform:0:1000"                  # time on a floor between trips, see trips.parse_dwell
+BANKS = ""                                # elevator banks and the floors they serve, see zones.py
+CAPACITY = 100                            # passengers per car
+FLOOR_DELAY = 1000                        # ms a car takes per floor
+DOOR_DELAY = 1500                         # ms to open or close the doors
+VERBOSE = False
+LOG_LEVEL = "info"
+LOG_FORMAT = "text"
+
+# Elevator states
+IDLE = "idle"                             # doors closed, nothing queued
+TRAVELLING = "travelling"                 # between floors, FLOOR_ARRIVAL pending
+OPENING = "opening"                       # DOOR_OPEN pending
+UNLOADING = "unloading"                   # dropping passengers, one ALIGHTING per passenger
+LOADING = "loading"                       # loading passengers, one BOARDING per passenger
+CLOSING = "closing"                       # DOOR_CLOSE pending
+DEPARTING = "departing"                   # doors closed, choosing the next floor
@@ -0,0 +1,416 @@
+import heapq
+from collections import deque
+from stops import lowest, highest, span, UP
+
+# name -> Dispatcher subclass
+STRATEGIES = {}
+
+def register(name):
+    # Class decorator that makes a strategy available as Elevators(logic=name).
+    # External modules can register their own the same way.
+    def decorator(cls):
+        cls.name = name
+        STRATEGIES[name] = cls
+        return cls
+    return decorator
+
+def create(logic, group):
+    if isinstance(logic, type) and issubclass(logic, Dispatcher):
+        return logic(group)
+    if logic not in STRATEGIES:
+        raise ValueError("Logic {} is not supported".format(logic))
+    return STRATEGIES[logic](group)
+
+class FloorIndex(object):
+    # Items bucketed by floor, with a bitset of non-empty floors so the
+    # nearest bucket to a floor is found without scanning
+    def __init__(self):
+        self.bits = 0
+        self.items = {}
+        self.count = 0
+
+    def __len__(self):
+        return self.count
+
+    def add(self, floor, item):
+        bucket = self.items.get(floor)
+        if bucket is None:
+            self.items[floor] = bucket = deque()
+            self.bits |= 1 << floor
+        bucket.append(item)
+        self.count += 1
+
+    def nearest(self, floor):
+        if not self.bits:
+            return None
+        up = self.bits >> floor
+        down = self.bits & ((1 << floor) - 1)
+        if not down:
+            return floor + lowest(up)
+        if not up:
+            return highest(down)
+        above = floor + lowest(up)
+        below = highest(down)
+        return above if above - floor <= floor - below else below
+
+    def pop_nearest(self, floor):
+        nearest = self.nearest(floor)
+        if nearest is None:
+            return None
+        bucket = self.items[nearest]
+        item = bucket.popleft()
+        self.count -= 1
+        if not bucket:
+            del self.items[nearest]
+            self.bits &= ~(1 << nearest)
+        return item
+
+class Dispatcher(object):
+    # Base dispatch strategy.
+    # assign() places a new hall call (floor, direction) on a car right away and
+    # returns the car's id, or False to leave the call pending; defer() stores
+    # a pending call and next_call() hands one to a car that just went idle.
+    # Pending calls may be served by a passing car in the meantime, so
+    # next_call() skips calls the group no longer has waiting. Idle cars are
+    # kept in a lazy min-heap of ids.
+    name = None
+
+    def __init__(self, group):
+        self.group = group
+        self.cars = group.elevators
+        self.idle = [car.index for car in self.cars if car.available]
+        self.idle_set = set(self.idle)
+        heapq.heapify(self.idle)
+
+    def take_idle(self, floor):
+        while self.idle:
+            id = heapq.heappop(self.idle)
+            self.idle_set.discard(id)
+            if self.cars[id].available:
+                return self.cars[id]
+        return None
+
+    def put_idle(self, elevator):
+        if elevator.index not in self.idle_set:
+            self.idle_set.add(elevator.index)
+            heapq.heappush(self.idle, elevator.index)
+
+    def assign(self, floor, direction, now):
+        elevator = self.take_idle(floor)
+        if elevator is None:
+            return False
+        elevator.call(floor, force=True, direction=direction)
+        return elevator.index
+
+    def defer(self, call, now):
+        raise NotImplementedError
+
+    def pop_call(self, elevator, now):
+        raise NotImplementedError
+
+    def next_call(self, elevator, now):
+        waiting = self.group.waiting
+        while True:
+            call = self.pop_call(elevator, now)
+            if call is None or call in waiting:
+                return call
+
+    def served(self, floor):
+        pass
+
+    def released(self, elevator, now):
+        # `elevator` went idle; returns the call it was given, or None
+        call = self.next_call(elevator, now)
+        if call is None:
+            self.put_idle(elevator)
+            return None
+        floor, direction = call
+        elevator.call(floor, force=True, direction=direction)
+        return call
+
+class QueueDispatcher(Dispatcher):
+    def __init__(self, group):
+        Dispatcher.__init__(self, group)
+        self.pending = deque()
+
+    def defer(self, call, now):
+        self.pending.append(call)
+
+@register("random")
+class RandomDispatcher(QueueDispatcher):
+    # First car in list order that is idle or already heading towards the floor
+    def assign(self, floor, direction, now):
+        for elevator in self.cars:
+            if (elevator.available):
+                elevator.call(floor, force=True, direction=direction)
+                return elevator.index
+            elif (elevator.direction == 1 and floor > elevator.current_floor):
+                elevator.call(floor, force=True, direction=direction)
+                return elevator.index
+            elif (elevator.direction == -1 and floor < elevator.current_floor):
+                elevator.call(floor, force=True, direction=direction)
+                return elevator.index
+        return False
+
+    def pop_call(self, elevator, now):
+        return self.pending.popleft() if self.pending else None
+
+@register("fcfs")
+class FCFSDispatcher(QueueDispatcher):
+    # Idle cars take calls strictly in the order they were made
+    def pop_call(self, elevator, now):
+        return self.pending.popleft() if self.pending else None
+
+@register("lifo")
+class LIFODispatcher(QueueDispatcher):
+    # Idle cars take the most recent call first
+    def pop_call(self, elevator, now):
+        return self.pending.pop() if self.pending else None
+
+@register("sjf")
+class SJFDispatcher(Dispatcher):
+    # Shortest job first: the job is the empty run to the caller, so a call
+    # goes to the nearest idle car and an idle car takes the nearest call.
+    # Idle cars and pending calls are both indexed by floor.
+    def __init__(self, group):
+        Dispatcher.__init__(self, group)
+        self.idle_cars = FloorIndex()
+        for id in self.idle:
+            self.idle_cars.add(self.cars[id].current_floor, id)
+        self.pending = FloorIndex()
+
+    def take_idle(self, floor):
+        while len(self.idle_cars):
+            id = self.idle_cars.pop_nearest(floor)
+            self.idle_set.discard(id)
+            if self.cars[id].available:
+                return self.cars[id]
+        return None
+
+    def put_idle(self, elevator):
+        if elevator.index not in self.idle_set:
+            self.idle_set.add(elevator.index)
+            self.idle_cars.add(elevator.current_floor, elevator.index)
+
+    def defer(self, call, now):
+        self.pending.add(call[0], call)
+
+    def pop_call(self, elevator, now):
+        return self.pending.pop_nearest(elevator.current_floor)
+
+@register("srtf")
+class SRTFDispatcher(Dispatcher):
+    # Shortest remaining time first: every call goes to the car that will be
+    # free soonest, busy or not. Each car's projected free time and end floor
+    # are updated incrementally as work is added, and kept in a lazy min-heap
+    # (stale entries carry an old version number).
+    def __init__(self, group):
+        Dispatcher.__init__(self, group)
+        self.free_at = [0] * len(self.cars)
+        self.anchor = [car.current_floor for car in self.cars]
+        self.version = [0] * len(self.cars)
+        self.heap = [(0, car.index, 0) for car in self.cars]
+        heapq.heapify(self.heap)
+
+    def job_time(self, elevator, start, floor):
+        return abs(start - floor) * elevator.speed + 2 * elevator.door_delay
+
+    def push(self, id, free_at):
+        self.version[id] += 1
+        self.free_at[id] = free_at
+        heapq.heappush(self.heap, (free_at, id, self.version[id]))
+
+    def assign(self, floor, direction, now):
+        while True:
+            free_at, id, version = heapq.heappop(self.heap)
+            if version == self.version[id]:
+                break
+        elevator = self.cars[id]
+        start = max(now, free_at)
+        self.push(id, start + self.job_time(elevator, self.anchor[id], floor))
+        self.anchor[id] = floor
+        elevator.call(floor, force=True, direction=direction)
+        return id
+
+    def defer(self, call, now):
+        pass                                  # assign() never leaves a call pending
+
+    def pop_call(self, elevator, now):
+        return None
+
+    def released(self, elevator, now):
+        self.anchor[elevator.index] = elevator.current_floor
+        self.push(elevator.index, now)
+        return None
+
+class DeadlineDispatcher(Dispatcher):
+    # Pending calls in a min-heap on priority(); ties keep call order
+    deadline = 45000                          # ms a hall call may wait
+
+    def __init__(self, group):
+        Dispatcher.__init__(self, group)
+        self.pending = []
+        self.counter = 0
+
+    def priority(self, call, now):
+        raise NotImplementedError
+
+    def defer(self, call, now):
+        self.counter += 1
+        heapq.heappush(self.pending, (self.priority(call, now), self.counter, call))
+
+    def pop_call(self, elevator, now):
+        return heapq.heappop(self.pending)[2] if self.pending else None
+
+@register("edf")
+class EDFDispatcher(DeadlineDispatcher):
+    # Earliest deadline first. A call's deadline is when its passengers
+    # should be at their destination: `journey` ms after the oldest of them
+    # started waiting (so a call re-made for passengers left behind keeps
+    # their deadline, until the landing is cleared), less the ride still
+    # ahead of them -- down to the lobby, or up half the rest of the zone.
+    # Calls with a long ride ahead are served first.
+    journey = 2 * DeadlineDispatcher.deadline # ms from the first press to arriving
+
+    def __init__(self, group):
+        DeadlineDispatcher.__init__(self, group)
+        self.top = group.zone[-1]
+
+    def priority(self, call, now):
+        floor, direction = call
+        waiting = self.group.landings[floor].queue(direction)
+        since = self.group.sim.passengers.called_at[waiting[0]] if waiting else now
+        floors = (self.top - floor) / 2 if direction == UP else floor - self.group.lobby
+        return since + self.journey - floors * self.cars[0].speed
+
+@register("llf")
+class LLFDispatcher(DeadlineDispatcher):
+    # Least laxity first: laxity is the deadline minus the time the nearest
+    # car needs to open its doors at the caller (EtaTable), as estimated
+    # when the call is deferred.
+    def __init__(self, group):
+        DeadlineDispatcher.__init__(self, group)
+        self.table = EtaTable(self.cars)
+
+    def priority(self, call, now):
+        floor, direction = call
+        table = self.table
+        service = min(table.eta(table.row(car), floor, direction, now) for car in self.cars)
+        return now + self.deadline - service
+
+@register("rr")
+class RoundRobinDispatcher(Dispatcher):
+    # Calls go to the cars in turn, busy or not
+    def __init__(self, group):
+        Dispatcher.__init__(self, group)
+        self.turn = 0
+
+    def assign(self, floor, direction, now):
+        elevator = self.cars[self.turn % len(self.cars)]
+        self.turn += 1
+        elevator.call(floor, force=True, direction=direction)
+        return elevator.index
+
+    def defer(self, call, now):
+        pass
+
+    def pop_call(self, elevator, now):
+        return None
+
+class EtaTable(object):
+    # Per-car inputs of the ETA estimate, one row per car: when its current
+    # step ends, the floor it is at by then, heading, stop bitset, load and
+    # the time one stop costs. Rows are cached and a car's row is rebuilt
+    # (in O(1), from its stop bitsets) only once that car has changed, so
+    # scoring a call costs a few integer operations per car.
+    def __init__(self, cars):
+        count = len(cars)
+        self.cars = cars
+        self.ready = [None] * count
+        self.floor = [0] * count
+        self.heading = [0] * count
+        self.bits = [0] * count
+        self.load = [0] * count
+        self.dwell = [0] * count
+
+    def row(self, elevator):
+        id = elevator.index
+        if (self.ready[id] != elevator.ready_at or self.bits[id] != elevator.queue.all
+                or self.heading[id] != elevator.direction or self.load[id] != elevator.load):
+            self.refresh(elevator)
+        return id
+
+    def refresh(self, elevator):
+        id = elevator.index
+        self.ready[id] = elevator.ready_at
+        self.floor[id] = elevator.target          # where the car is once its step ends
+        self.heading[id] = elevator.direction
+        self.bits[id] = elevator.queue.all
+        self.load[id] = elevator.load
+        # doors open and close at every stop, and the riders get off spread over the stops
+        riders = elevator.load / max(1, len(elevator.queue))
+        self.dwell[id] = 2 * elevator.door_delay + elevator.passenger_idle_time * (1 + riders)
+
+    def eta(self, id, floor, direction, now):
+        # ms until car `id` opens its doors at `floor` for a `direction` call,
+        # following its LOOK sweep: on to the last stop ahead, back to the
+        # last stop behind, then ahead again. Every stop in the swept range
+        # is counted as made on the way.
+        start = self.floor[id]
+        heading = self.heading[id]
+        bits = self.bits[id]
+        if heading == 0 or not bits:
+            low, high = min(start, floor), max(start, floor)
+            distance = high - low
+        else:
+            if heading == UP:
+                far, back = max(start, highest(bits)), min(start, lowest(bits))
+            else:
+                far, back = min(start, lowest(bits)), max(start, highest(bits))
+            if (floor - start) * heading >= 0 and direction != -heading:
+                low, high = min(start, floor), max(start, floor)
+                distance = high - low
+            elif direction != heading:
+                # picked up on the way back, after the turnaround
+                far = max(far, floor) if heading == UP else min(far, floor)
+                low, high = min(start, far, floor), max(start, far, floor)
+                distance = abs(far - start) + abs(far - floor)
+            else:
+                # behind the car and going its way: a whole sweep away
+                back = min(back, floor) if heading == UP else max(back, floor)
+                low, high = min(far, back), max(far, back)
+                distance = abs(far - start) + abs(far - back) + abs(floor - back)
+        stops = span(bits, low, high) - ((bits >> start) & 1)
+        if floor != start:
+            stops -= (bits >> floor) & 1
+        car = self.cars[id]
+        return max(0, self.ready[id] - now) + distance * car.speed + max(0, stops) * self.dwell[id]
+
+@register("eta")
+class ETADispatcher(Dispatcher):
+    # Group control on predicted time of arrival: every hall call goes to the
+    # car, busy or not, that can open its doors at the caller soonest (see
+    # EtaTable). Full cars are only picked when every car is full.
+    def __init__(self, group):
+        Dispatcher.__init__(self, group)
+        self.table = EtaTable(self.cars)
+
+    def assign(self, floor, direction, now):
+        table = self.table
+        best = None
+        for elevator in self.cars:
+            id = table.row(elevator)
+            cost = (elevator.load >= elevator.capacity, table.eta(id, floor, direction, now))
+            if best is None or cost < best_cost:
+                best, best_cost = elevator, cost
+        best.call(floor, force=True, direction=direction)
+        return best.index
+
+    def defer(self, call, now):
+        pass                                  # assign() never leaves a call pending
+
+    def pop_call(self, elevator, now):
+        return None
+
+    def released(self, elevator, now):
+        return None
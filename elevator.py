@@ -1,27 +1,20 @@
-from random import random
-from tabnanny import check
-import time
-import math
-import asyncio
-from helpers import setTimeout, cprint, timestamp
+from random import Random
+from array import array
+from collections import deque
+from logger import Logger, SILENT, OFF
+from events import EventQueue, ARRIVAL, HALL_CALL, DOOR_OPEN, DOOR_CLOSE, FLOOR_ARRIVAL, BOARDING, ALIGHTING, DEPARTURE, METRICS
+from metrics import Metrics
+from profiling import Profiler
+from export import Exporter
+from trips import DwellTime
+from traffic import trip_source
+from traces import TraceTrips
+from streams import Streams
+from stops import StopQueue, CABIN
+from zones import parse_banks, Routes
+import dispatch
 from constants import *
 
-TERMINATE = [False, False, False]
-floors = []
-probability = None
-building = None
-elevators = None
-
-class VirtualTime():
-    def __init__(self):
-        self.time = 0
-
-    def increment(self, amount):
-        self.time += amount
-
-    def get(self):
-        return self.time
-
 class Probability():
 
     class ProbabilityEntry():
@@ -29,7 +22,8 @@ class Probability():
             self.probability = probability
             self.value = value
 
-    def __init__(self, prob):
+    def __init__(self, prob, rng=None, log=SILENT):
+        self.rng = rng or Random()
         self.min = prob['min']
         self.max = prob['max']
         self.discrete = prob.get('discrete', False)
@@ -39,11 +33,11 @@ class Probability():
         self.probabilites = [Probability.ProbabilityEntry(x['probability'] / tmp_sum, x['value']) for x in prob['probability']]
         self.probabilites.sort(key=lambda x: x.probability, reverse=True)
         for p in self.probabilites:
-            cprint(f"Probability: {p.probability} Value: {p.value}", 'cyan')
+            log.debug("Probability: {} Value: {}", p.probability, p.value, color='cyan')
 
 
     def rand(self):
-        r = random()
+        r = self.rng.random()
         for p in self.probabilites:
             if r <= p.probability:
                 return p.value
@@ -51,322 +45,470 @@ class Probability():
         return self.probabilites[-1].value
 
     def rand_unique(self, count, default=None):
-        # get count unique random values
+        # get count unique random values; each pick is drawn from the mass not
+        # taken yet, so a dominant value never causes redraws
         values = []
         if (default is not None):
             values.append(default)
             count -= 1
         for i in range(count):
-            value = self.rand()
-            while value in values:
-                value = self.rand()
+            remaining = [p for p in self.probabilites if p.value not in values]
+            if (len(remaining) == 0):
+                raise ValueError("Cannot draw {} unique values".format(count + len(values) - i))
+            r = self.rng.random() * sum(p.probability for p in remaining)
+            value = remaining[-1].value
+            for p in remaining:
+                if r <= p.probability:
+                    value = p.value
+                    break
+                r -= p.probability
             values.append(value)
         return values
 
-class Passenger(object):
-    def __init__(self, id, start, end, random=random):
-        self.id = id
-        self.origin = start
-        self.destination = end
-        self.wait = []
-
+# Passenger states
+WAITING = 0                               # on floor `location`, waiting for a car
+RIDING = 1                                # in car `location`
+DWELLING = 2                              # on floor `location` between trips
+LEFT = 3                                  # left the building
+
+class Passengers(object):
+    # Every passenger of a run, stored as typed columns indexed by passenger id.
+    # Floors and cars hold ids; `state`/`location` say where a passenger is.
+    def __init__(self, sim=None):
+        self.sim = sim
+        self.origin = array('i')
+        self.destination = array('i')
+        self.state = array('b')
+        self.location = array('i')
+        self.arrived_at = array('d')      # ms, entered the building
+        self.called_at = array('d')       # ms, started waiting for the current leg
+        self.boarded_at = array('d')      # ms, boarded for the current leg
+        self.leg = array('i')             # floor the current leg ends at (a transfer floor or the destination)
+        self.waited = array('d')          # ms waited on earlier legs of the current trip
+        self.rode = array('d')            # ms ridden on earlier legs of the current trip
+        # one row per finished trip
+        self.trip_passenger = array('i')
+        self.trip_wait = array('d')       # ms waited for a car
+        self.trip_ride = array('d')       # ms spent in a car
+
+    def __len__(self):
+        return len(self.origin)
+
+    def add(self, start, end, now=0):
         if start == end:
             raise ValueError('Passenger cannot have same origin and destination')
-
-        if not callable(random):
-            if random == "Gaussian":
-                self.random = lambda: math.ceil(abs(random.gauss(10000, 1000)))
-            elif random == "Uniform":
-                self.random = lambda: math.ceil(random.uniform(10000, 100000))
-            elif random == "Discrete":
-                self.random = lambda: math.ceil(random.randint(10000, 100000))
-            elif random == "Exponential":
-                self.random = lambda: math.ceil(random.expovariate(1/10000))
-            else:
-                self.random = math.ceil(random.random() * 100000)
+        id = len(self.origin)
+        self.origin.append(start)
+        self.destination.append(end)
+        self.state.append(WAITING)
+        self.location.append(start)
+        self.arrived_at.append(now)
+        self.called_at.append(now)
+        self.boarded_at.append(0)
+        self.leg.append(end)
+        self.waited.append(0)
+        self.rode.append(0)
+        return id
+
+    def boarded(self, id, car, now):
+        self.state[id] = RIDING
+        self.location[id] = car
+        self.boarded_at[id] = now
+
+    def dropped(self, id, floor, now):
+        wait = self.boarded_at[id] - self.called_at[id]
+        ride = now - self.boarded_at[id]
+        if floor != self.destination[id]:
+            # a transfer floor: the trip goes on with the next bank right away
+            self.waited[id] += wait
+            self.rode[id] += ride
+            self.origin[id] = floor
+            self.state[id] = WAITING
+            self.location[id] = floor
+            self.run(id)
+            return True
+        wait += self.waited[id]
+        ride += self.rode[id]
+        self.waited[id] = 0
+        self.rode[id] = 0
+        self.trip_passenger.append(id)
+        self.trip_wait.append(wait)
+        self.trip_ride.append(ride)
+        self.sim.metrics.trip(wait, ride, now)
+        self.origin[id] = floor
+        self.state[id] = DWELLING
+        self.location[id] = floor
+        sim = self.sim
+        if floor == self.destination[id] and floor == STAR_FLOOR:
+            sim.building.remove_passenger(id)
         else:
-            self.random = random
-
-        cprint(f'DECLARATION: Passenger {self.id} created', 'magenta')
-
-
-    def gen_passengers(self, count, start, end):
-        return [Passenger(i, start.rand(), end.rand()) for i in range(count)]
-
-    def dropped(self):
-        if self.origin == self.destination and self.origin == STAR_FLOOR:
-            building.remove_passenger(self)
+            # time spent on the floor before deciding to move again
+            time_to_move = sim.dwell.sample()
+            sim.events.schedule(time_to_move, ARRIVAL, self.move, id)
         return True
 
-    def move(self):
-        self.destination = list(filter(lambda x: x != self.origin, probability.rand_unique(2, default=self.origin)))[0]
-        print(f'Passenger {self.id} decided to go from {self.origin} to {self.destination}')
-
-    def run(self):
-        direction = 1 if self.origin < self.destination else (-1 if self.origin > self.destination else 0)
-        if (direction == 1 and not floors[self.origin].called_up):
-            floors[self.origin].call_up()
-        elif (direction == -1 and not floors[self.origin].called_down):
-            floors[self.origin].call_down()
-
-        while self.origin != self.destination:
-            continue
-        time_to_move = self.random()
-        setTimeout(time_to_move, self.move)
+    def move(self, id):
+        sim = self.sim
+        origin = self.origin[id]
+        self.destination[id] = list(filter(lambda x: x != origin, sim.probability.rand_unique(2, default=origin)))[0]
+        sim.log.debug('Passenger {} decided to go from {} to {}', id, origin, self.destination[id])
+        self.state[id] = WAITING
+        self.run(id)
+
+    def run(self, id):
+        # Queue up at the landing of the bank that takes the next leg, on the
+        # side of the leg's direction
+        sim = self.sim
+        self.called_at[id] = sim.events.now()
+        origin = self.origin[id]
+        bank, leg = sim.elevators.route(origin, self.destination[id])
+        self.leg[id] = leg
+        direction = 1 if origin < leg else -1
+        landing = bank.landings[origin]
+        landing.enqueue(id, direction)
+        self.call(landing, direction)
+
+    def call(self, floor, direction):
+        # Press the hall button of a bank's landing unless it is already lit
+        sim = self.sim
+        if (direction == 1 and not floor.called_up):
+            floor.call_up()
+        elif (direction == -1 and not floor.called_down):
+            floor.call_down()
+        else:
+            return
+        sim.events.schedule(0, HALL_CALL, floor.bank.call, floor.floor, direction)
+        sim.log.debug("BUILDING: Elevator called to floor {}", floor.floor, color="blue")
 
 class Floor(object):
-    def __init__(self, passengers_count, floor):
-        self.passengers_count = passengers_count
-        self.passengers = set()
+    # A floor of the building, and also a bank's landing on it: the waiting
+    # queues and hall buttons belong to the bank (`bank`) whose cars serve them
+    def __init__(self, passengers_count, floor, log=SILENT, bank=None):
+        self.log = log
+        self.bank = bank
+        self.passengers_count = passengers_count      # passengers on this floor
+        self.up = deque()                             # ids waiting to go up, in arrival order
+        self.down = deque()                           # ids waiting to go down, in arrival order
         self.floor = floor
+        # Hall buttons. A button stays lit from the first press until a car
+        # that answered it leaves (recall), while its queue can be emptied and
+        # refilled with the doors open, so it is kept apart from the queues
         self.called_up = False
         self.called_down = False
 
-        cprint(f'DECLARATION: Floor {self.floor} created', 'magenta')
+        log.debug('DECLARATION: Floor {} created', self.floor, color='magenta')
 
     def add_passenger(self, passenger):
-        self.passengers.add(passenger)
+        self.passengers_count += 1
 
     def remove_passenger(self, passenger):
-        passenger in self.passengers and self.passengers.remove(passenger)
+        self.passengers_count -= 1
+
+    def enqueue(self, passenger, direction):
+        (self.up if direction == 1 else self.down).append(passenger)
+
+    def queue(self, direction):
+        return self.up if direction == 1 else self.down
 
     def call_up(self):
         self.called_up = True
-        print(f'Floor {self.floor} called up')
+        self.log.debug('Floor {} called up', self.floor)
 
     def call_down(self):
         self.called_down = True
-        print(f'Floor {self.floor} called down')
+        self.log.debug('Floor {} called down', self.floor)
 
     def uncall(self):
         self.called_up = False
         self.called_down = False
 
+    def recall(self, passengers):
+        # Light the buttons again for whoever is still waiting
+        self.uncall()
+        self.up and passengers.call(self, 1)
+        self.down and passengers.call(self, -1)
+
     def print_summary(self):
-        print(f'Floor {self.floor} has {len(self.passengers)} passengers and floor is called up: {self.called_up} and called down: {self.called_down}')
+        self.log.info('Floor {} has {} passengers and floor is called up: {} and called down: {}', self.floor, self.passengers_count, self.called_up, self.called_down)
 
     def check_floor(self):
-        available_passengers = [x for x in self.passengers if x.origin == self.floor and x.destination != self.floor]
         return {
-            "len": len(available_passengers),
-            "passengers": available_passengers
+            "len": len(self.up) + len(self.down),
+            "up": len(self.up),
+            "down": len(self.down)
         }
 
 class Elevator(object):
-    def __init__(self, id, floors, capacity, speed, door_delay, passenger_idle_time, current_floor = 1):
-        self.id = id
+    def __init__(self, id, floors, capacity, speed, door_delay, passenger_idle_time, current_floor = 1, sim = None, bank = None, index = None):
+        self.id = id                      # index in the whole fleet
+        self.index = id if index is None else index   # index in its bank, what the dispatcher knows it by
+        self.bank = bank
         self.floors = floors
         self.capacity = capacity
         self.speed = speed                # ms per floor
         self.current_floor = current_floor
-        self.passenagers = set()
-        self.direction = 1                # 1 = up, -1 = down, 0 is idle
-        self.available = True
-        self.queue = []
+        self.passenagers = {}             # destination floor -> ids of the passengers riding there
+        self.load = 0                     # passengers in the car
+        self.direction = 0                # 1 = up, -1 = down, 0 is idle
+        self.state = IDLE
+        self.target = current_floor       # floor the car is travelling to
+        self.queue = StopQueue()
         self.door_delay = door_delay
         self.passenger_idle_time = passenger_idle_time
-        self.time = 0
+        self.time = 0                     # busy time (ms)
+        self.ready_at = 0                 # virtual time (ms) the current step ends
+        self.sim = sim
+        self.events = sim.events
+        self.log = sim.log
 
-        cprint(f'DECLARATION: Elevator {self.id} created', 'magenta')
+        self.log.debug('DECLARATION: Elevator {} created', self.id, color='magenta')
 
-    def add_to_queue(self, floor):
-        if floor not in self.queue:
-            self.queue.append(floor)
+    @property
+    def available(self):
+        return self.state == IDLE
 
-    def add_passenger(self, passenger):
-        if passenger.destination == passenger.origin:
-            return
-        elif (self.capacity - len(self.passenagers)) > 0:
-            self.passenagers.add(passenger)
-            floors[passenger.origin].remove_passenger(passenger)
-            self.add_to_queue(passenger.destination)
+    def add_to_queue(self, floor, direction=CABIN):
+        self.queue.add(floor, direction)
 
     def sleep(self, time):
         self.time += time
 
-    def open_door(self, sleep_time = 1000):
-        print("ELEVATOR {}: Opening door on floor {}".format(self.id, self.current_floor))
-        self.sleep(sleep_time)
-
-    def close_door(self, sleep_time = 1000):
-        print("ELEVATOR {}: Closing door on floor {}".format(self.id, self.current_floor))
-        self.sleep(sleep_time)
-
-    def drop_passengers(self):
-        lock_psg = self.passenagers.copy()
-        for passenger in lock_psg:
-            if passenger.destination == self.current_floor:
-                self.passenagers.remove(passenger)
-                floors[passenger.origin].remove_passenger(passenger)
-                passenger.origin = self.current_floor
-                floors[self.current_floor].add_passenger(passenger)
-                passenger.dropped()
-                print("ELEVATOR {}: Dropped passenger {} on floor {}".format(self.id, passenger.id, self.current_floor))
-                self.sleep(self.passenger_idle_time)
-
-    def load_passengers(self, passengers, capacity):
-        length = 0
-        while True:
-            if (len(passengers) == 0):
-                break
-            if (self.capacity - len(self.passenagers)) == 0:
-                break
-            passenger = passengers.pop()
-            if passenger.origin == self.current_floor:
-                length += 1
-                self.passenagers.add(passenger)
-                floors[passenger.origin].remove_passenger(passenger)
-                self.add_to_queue(passenger.destination)
-                print("ELEVATOR ROUTINE {}: Loaded passenger {} on floor {}".format(self.id, passenger.id, self.current_floor))
-        return length
+    def drop_passenger(self, passenger):
+        self.load -= 1
+        self.sim.metrics.load_changed(self, self.events.now())
+        self.sim.floors[self.current_floor].add_passenger(passenger)
+        self.log.debug("ELEVATOR {}: Dropped passenger {} on floor {}", self.id, passenger, self.current_floor)
+        self.sleep(self.passenger_idle_time)
+        self.sim.passengers.dropped(passenger, self.current_floor, self.events.now())
+
+    def load_passenger(self, passenger):
+        people = self.sim.passengers
+        destination = people.leg[passenger]
+        people.boarded(passenger, self.id, self.events.now())
+        bucket = self.passenagers.get(destination)
+        if bucket is None:
+            self.passenagers[destination] = [passenger]
+        else:
+            bucket.append(passenger)
+        self.load += 1
+        self.sim.metrics.load_changed(self, self.events.now())
+        self.sim.floors[self.current_floor].remove_passenger(passenger)
+        self.add_to_queue(destination)
+        self.log.debug("ELEVATOR ROUTINE {}: Loaded passenger {} on floor {}", self.id, passenger, self.current_floor)
+        self.sleep(self.passenger_idle_time)
 
     def dequeue_current_floor(self):
-        if self.current_floor in self.queue:
-            self.queue.remove(self.current_floor)
+        self.queue.clear(self.current_floor)
 
     def next_floor(self):
-        if len(self.queue) == 0:
-            return None
-        if self.direction == 1:
-            return min(self.queue)
-        elif self.direction == -1:
-            return max(self.queue)
-        else:
-            return None
-
-    # Elevator lifecycle
-    # 1. Open door (1000ms)
-    # 2. Drop passengers
-    ## 2.1. Check if passengers are on current floor
-    ## 2.2. Remove passengers from elevator
-    ## 2.3. Add passengers to floor
-    # 3. Load passengers
-    ## 3.1. Check if passengers are on current floor
-    ## 3.2. Add passengers to elevator
-    ## 3.3. Remove passengers from floor
-    # 4. Close door (1000ms)
-    # 5. Move to next floor
-    # 6. Repeat from 1
+        return self.queue.next_stop(self.current_floor, self.direction)
+
+    # Elevator lifecycle as a state machine. Every transition that takes time
+    # schedules one event whose handler is advance(); zero-time transitions run
+    # in advance()'s loop, so nothing recurses and the length of a run is only
+    # bounded by the event budget. A step returns None to continue, a
+    # (delay, kind) pair to schedule the next step, or False to stop.
+    # TRAVELLING --FLOOR_ARRIVAL--> OPENING --DOOR_OPEN (door_delay)--> UNLOADING
+    # UNLOADING --ALIGHTING (passenger_idle_time) per passenger--> LOADING
+    # LOADING --BOARDING (passenger_idle_time) per passenger--> CLOSING
+    # CLOSING --DOOR_CLOSE (door_delay)--> DEPARTING
+    # DEPARTING --> TRAVELLING (speed ms per floor) or IDLE
+    def advance(self):
+        while True:
+            state = self.state
+            if state == TRAVELLING:
+                step = self.arrive()
+            elif state == OPENING:
+                step = self.door_opened()
+            elif state == UNLOADING:
+                step = self.alight()
+            elif state == LOADING:
+                step = self.board()
+            elif state == CLOSING:
+                step = self.door_closed()
+            elif state == DEPARTING:
+                step = self.move()
+            else:
+                return
+            if step is False:
+                return
+            if step is not None:
+                delay, kind = step
+                self.ready_at = self.events.now() + delay
+                self.events.schedule(delay, kind, self.advance)
+                return
+
+    def arrive(self):
+        self.current_floor = self.target
+        self.execute_floor_move()
+        return (self.door_delay, DOOR_OPEN)
+
     def execute_floor_move(self):
         # Debug Information
-        cprint(f'DEBUG INFO: Elevator {self.id} has queue {self.queue}', 'yellow')
-        cprint(f'DEBUG INFO: Elevator {self.id} has {len(self.passenagers)} passengers', 'yellow')
-        cprint(f'DEBUG INFO: Elevator {self.id} has current floor {self.current_floor}', 'yellow')
-        cprint(f'DEBUG INFO: Elevator {self.id} has direction {self.direction}', 'yellow')
-        cprint(f'DEBUG INFO: Elevator {self.id} has available {self.available}', 'yellow')
-
-        # Open door
-        self.open_door(self.door_delay)
-        cprint(f'ELEVATOR {self.id}: Door opened on floor {self.current_floor}', 'red')
-
-        # Drop passengers
-        dropped_count = sum([1 for passenger in self.passenagers if passenger.destination == self.current_floor])
-        self.drop_passengers()
-        cprint(f'ELEVATOR {self.id}: Dropped {dropped_count} passengers on floor {self.current_floor}', 'red')
-
-        # Load passengers
-        checked_floor = floors[self.current_floor].check_floor()
-        if (checked_floor['len'] > 0):
-            remaining_capacity = self.capacity - len(self.passenagers)
-            if (remaining_capacity > 0):
-
-                cprint(f'ELEVATOR {self.id}: Found {checked_floor["len"]} passengers on floor {self.current_floor}', 'red')
-                loaded = self.load_passengers(checked_floor['passengers'], remaining_capacity)
-
-                remaining_capacity = self.capacity - min(remaining_capacity, len(self.passenagers))                          # this might fail if integrity is violated
-                if (not remaining_capacity == (self.capacity - len(self.passenagers))):
-                    cprint(f'DEBUG IN ELEVATOR {self.id}: Integrity check violated on floor {self.current_floor}', 'yellow')
-
-                # log information
-                cprint(f'ELEVATOR {self.id}: Loaded {loaded} passengers on floor {self.current_floor}', 'red')
-                cprint(f'ELEVATOR {self.id}: Remaining capacity {remaining_capacity} on floor {self.current_floor}', 'red')
-
-        # Close door
-        self.close_door(self.door_delay)
-        cprint(f'ELEVATOR {self.id}: Door closed on floor {self.current_floor}', 'red')
-
-        # Dequeue current floor
+        log = self.log
+        log.debug('DEBUG INFO: Elevator {} has queue {}', self.id, self.queue)
+        log.debug('DEBUG INFO: Elevator {} has {} passengers', self.id, self.load)
+        log.debug('DEBUG INFO: Elevator {} has current floor {}', self.id, self.current_floor)
+        log.debug('DEBUG INFO: Elevator {} has direction {}', self.id, self.direction)
+        log.debug('DEBUG INFO: Elevator {} has state {}', self.id, self.state)
+
+        log.debug("ELEVATOR {}: Opening door on floor {}", self.id, self.current_floor)
+        self.sleep(self.door_delay)
+        self.state = OPENING
+
+    def door_opened(self):
+        self.log.debug('ELEVATOR {}: Door opened on floor {}', self.id, self.current_floor, color='red')
+        # Calls made to this floor while the door is open are served by this stop
         self.dequeue_current_floor()
+        self.bank.served(self.current_floor)
+        self.state = UNLOADING
+
+    def alight(self):
+        bucket = self.passenagers.get(self.current_floor)
+        if bucket:
+            passenger = bucket.pop()
+            if not bucket:
+                del self.passenagers[self.current_floor]
+            self.drop_passenger(passenger)
+            return (self.passenger_idle_time, ALIGHTING)
+        self.state = LOADING
+
+    def boarding_direction(self, floor):
+        # The car keeps its direction while it has stops ahead or people here
+        # going its way; otherwise it turns around (an idle car takes up first)
+        direction = self.direction
+        if (direction == 0):
+            return 1 if floor.up else -1
+        if (floor.queue(direction) or not self.queue.should_reverse(self.current_floor, direction)):
+            return direction
+        return -direction
+
+    def board(self):
+        # Only passengers going the car's way get on, first come first served
+        floor = self.bank.landings[self.current_floor]
+        if (self.capacity - self.load) > 0:
+            direction = self.boarding_direction(floor)
+            waiting = floor.queue(direction)
+            if waiting:
+                self.direction = direction
+                self.load_passenger(waiting.popleft())
+                return (self.passenger_idle_time, BOARDING)
+
+        self.log.debug('ELEVATOR {}: Remaining capacity {} on floor {}', self.id, self.capacity - self.load, self.current_floor, color='red')
+        self.log.debug("ELEVATOR {}: Closing door on floor {}", self.id, self.current_floor)
+        self.sleep(self.door_delay)
+        self.state = CLOSING
+        return (self.door_delay, DOOR_CLOSE)
+
+    def door_closed(self):
+        self.log.debug('ELEVATOR {}: Door closed on floor {}', self.id, self.current_floor, color='red')
+        self.state = DEPARTING
 
-        # Move to next floor
+    def move(self):
         if (len(self.queue) > 0):
-            self.sleep(self.speed)
-            self.current_floor = self.next_floor()
-            self.execute_floor_move()
-            cprint(f'ELEVATOR {self.id}: Moving to floor {self.current_floor}', 'red')
-        else:
-            self.direction = 0
-            self.available = True
-            cprint(f'ELEVATOR {self.id}: Elevator is now idle', 'red')
-
-    def call(self, floor, force=False):
-        force and self.add_to_queue(floor)
+            target = self.next_floor()
+            self.direction = 1 if target > self.current_floor else (-1 if target < self.current_floor else self.direction)
+            travel = self.speed * abs(target - self.current_floor)
+            self.sleep(travel)
+            self.log.debug('ELEVATOR {}: Moving to floor {}', self.id, target, color='red')
+            self.target = target
+            self.state = TRAVELLING
+            # Passengers left behind (car full or going the other way) call
+            # again once the car is on its way, so it is not handed them back
+            self.bank.landings[self.current_floor].recall(self.sim.passengers)
+            return (travel, FLOOR_ARRIVAL)
+        self.direction = 0
+        self.state = IDLE
+        self.log.debug('ELEVATOR {}: Elevator is now idle', self.id, color='red')
+        self.bank.landings[self.current_floor].recall(self.sim.passengers)
+        self.bank.dispatch(self)
+        return False                      # dispatch() may already have woken the car again
+
+    def call(self, floor, force=False, direction=CABIN):
+        # Only queues the floor; an idle car is woken by a scheduled event,
+        # never by running its lifecycle inside the caller
         if (abs(floor) > abs(self.floors)):
             raise ValueError("Floor {} is out of bounds".format(floor))
+        force and self.add_to_queue(floor, direction)
         if (self.direction == 1 and floor > self.current_floor):
-            self.add_to_queue(floor)
+            self.add_to_queue(floor, direction)
         elif (self.direction == -1 and floor < self.current_floor):
-            self.add_to_queue(floor)
-        elif (self.direction == 0):
+            self.add_to_queue(floor, direction)
+        elif (self.state == IDLE):
             self.direction = 1 if floor > self.current_floor else -1
-            self.add_to_queue(floor)
-            self.execute_floor_move()
-
-    def run(self):
-        while True:
-            if (self.available and len(self.queue) > 0):
-                self.available = False
-                self.execute_floor_move()
-            else:
-                self.sleep(0.5)
+            self.add_to_queue(floor, direction)
+            self.state = DEPARTING
+            self.events.schedule(0, DEPARTURE, self.advance)
 
 class Elevators(object):
-
-    # delays (ms)
-    door_delay = 1500
+    # The building's fleet, as one or more banks (see zones.py). A trip is
+    # routed to a bank through the Routes table in O(1), and a hall call only
+    # ever involves the cars of that bank.
+    def __init__(self, count, floors, logic = ALGORITHIM, sim = None, banks = BANKS):
+        self.log = sim.log
+        self.floors = floors
+        self.banks = []
+        self.elevators = []
+        for cars, zone in parse_banks(banks, floors, count):
+            bank = Bank(len(self.banks), cars, floors, zone, logic, sim, len(self.elevators))
+            self.banks.append(bank)
+            self.elevators.extend(bank.elevators)
+        self.count = len(self.elevators)
+        self.routes = Routes([bank.zone for bank in self.banks], floors) if len(self.banks) > 1 else None
+
+        self.log.debug('DECLARATION: Elevators created', color='magenta')
+
+    def route(self, origin, destination):
+        # (bank, floor) of the next leg of a trip from origin to destination
+        if (self.routes is None):
+            return self.banks[0], destination
+        bank, floor = self.routes.hop(origin, destination)
+        return self.banks[bank], floor
+
+    def waiting_at(self, floor):
+        # (up, down) passengers waiting at `floor` over every bank
+        landings = [bank.landings[floor] for bank in self.banks]
+        return sum(len(landing.up) for landing in landings), sum(len(landing.down) for landing in landings)
+
+class Bank(object):
+    # Cars sharing one set of hall buttons (a landing per floor) and one
+    # dispatch strategy, serving the floors in `zone`; an express bank
+    # simply has no calls on the floors it skips.
+
+    # delays (ms); floor and door delays are per run, see Simulation
     caller_delay = 300
-    floor_delay = 1000
 
-    def __init__(self, count, floors, logic = ALGORITHIM):
+    def __init__(self, id, count, floors, zone, logic = ALGORITHIM, sim = None, first = 0):
+        self.id = id
+        self.log = sim.log
         self.count = count
         self.floors = floors
-        self.elevators = [Elevator(id(i), floors, 100, self.floor_delay, self.door_delay, self.caller_delay, 1) for i in range(count)]
-        self.queued = set()
-        self.waiting = set()
-        if (logic == "random"):
-            self.handle_call_logic = self.random_logic
-        elif (logic == "fcfs"):
-            self.handle_call_logic = self.fcfs_logic
-        elif (logic == "sjf"):
-            self.handle_call_logic = self.sjf_logic
-        elif (logic == "srtf"):
-            self.handle_call_logic = self.srtf_logic
-        elif (logic == "edf"):
-            self.handle_call_logic = self.edf_logic
-        elif (logic == "llf"):
-            self.handle_call_logic = self.llf_logic
-        elif (logic == "rr"):
-            self.handle_call_logic = self.rr_logic
-        else:
-            raise ValueError("Logic {} is not supported".format(logic))
-
-        cprint(f'DECLARATION: Elevators created', 'magenta')
-
-    def random_logic(self, floor):
-        for elevator in self.elevators:
-            if (elevator.available):
-                elevator.call(floor, force=True)
-                return elevator.id
-            elif (elevator.direction == 1 and floor > elevator.current_floor):
-                elevator.call(floor, force=True)
-                return elevator.id
-            elif (elevator.direction == -1 and floor < elevator.current_floor):
-                elevator.call(floor, force=True)
-                return elevator.id
+        self.zone = zone                  # sorted floors the bank serves
+        self.lobby = STAR_FLOOR if STAR_FLOOR in zone else zone[0]
+        self.landings = [Floor(0, x, sim.log, self) for x in range(0, floors)]
+        self.elevators = [Elevator(first + i, floors, sim.capacity, sim.floor_delay, sim.door_delay, self.caller_delay, self.lobby, sim, self, i) for i in range(count)]
+        self.sim = sim
+        self.queued = set()               # (floor, direction) hall calls assigned to a car
+        self.waiting = {}                 # (floor, direction) -> ms, hall calls no car could take yet
+        self.strategy = dispatch.create(logic, self)
+        self.handle_call_logic = self.strategy.assign
+
+        self.log.debug('DECLARATION: Bank {} created', self.id, color='magenta')
+
+    def set_logic(self, logic):
+        # Switch strategies mid-run (e.g. in a branch forked off a snapshot):
+        # calls still pending go to the new strategy, oldest first
+        self.strategy = dispatch.create(logic, self)
+        self.handle_call_logic = self.strategy.assign
+        pending = sorted(self.waiting.items(), key=lambda item: item[1])
+        self.waiting = {}
+        now = self.sim.events.now()
+        for call, since in pending:
+            if (self.handle_call_logic(call[0], call[1], now) is not False):
+                self.queued.add(call)
             else:
-                continue
-        return False
-
+                self.waiting[call] = since
+                self.strategy.defer(call, since)
 
     def call(self, origin, direction):
         if (origin < 1 or origin > self.floors):
@@ -375,123 +517,194 @@ class Elevators(object):
             raise ValueError("Direction {} is not valid".format(direction))
         if (direction == 0):
             return
+        call = (origin, direction)
+        if (call in self.queued or call in self.waiting):
+            self.log.debug("ELEVATORS: Floor {} is already queued", origin, color="green")
+            return
 
-        self.waiting.add(origin)
-
-    def simulate(self):
-        while True:
-            for floor in floors:
-                called = floor.called_up or floor.called_down
-                floor.uncall()
-                floor = floor.floor
-                if ((not floor in self.waiting) and called):
-                    self.waiting.add(floor)
-                    self.handle_call_logic(floor)
-            cprint("DEBUG | WAITING: {}".format(self.waiting), "yellow")
-            cprint("DEBUG | QUEUED: {}".format(self.queued), "yellow")
-            if (len(self.waiting) > 0):
-                TERMINATE[1] = False
-                floor = self.waiting.pop()
-                if (floor in self.queued):
-                    cprint("ELEVATORS: Floor {} is already queued".format(floor), "green")
-                    continue
-                handled = self.handle_call_logic(floor)
-                if (handled):
-                    self.queued.add(floor)
-                    cprint("ELEVATORS: Found elevator {} for floor {}".format(handled, floor), "green")
-                else:
-                    cprint("ELEVATORS: No elevator available, adding floor {} to waiting list".format(floor), "green")
-                    self.waiting.add(floor)
-            else:
-                if (all(TERMINATE)):
-                    print("", flush=True)
-                    break
-                cprint("ELEVATORS: No waiting calls", "green")
-                TERMINATE[1] = True
-            time.sleep(1)
+        # The strategy returns the id of the car that took the call, or False
+        now = self.sim.events.now()
+        handled = self.handle_call_logic(origin, direction, now)
+        if (handled is not False):
+            self.queued.add(call)
+            self.log.debug("ELEVATORS: Found elevator {} for floor {}", handled, origin, color="green")
+        else:
+            self.waiting[call] = now
+            self.strategy.defer(call, now)
+            self.log.debug("ELEVATORS: No elevator available, adding floor {} to waiting list", origin, color="green")
+
+    def dispatch(self, elevator):
+        # `elevator` went idle; let the strategy hand it a waiting call
+        call = self.strategy.released(elevator, self.sim.events.now())
+        if (call is not None):
+            del self.waiting[call]
+            self.queued.add(call)
+            self.log.debug("ELEVATORS: Found elevator {} for floor {}", elevator.id, call[0], color="green")
+
+    def served(self, floor):
+        # A car opened at `floor`; whoever it leaves behind calls again when it leaves (Floor.recall)
+        for call in ((floor, 1), (floor, -1)):
+            self.queued.discard(call)
+            self.waiting.pop(call, None)
+        self.strategy.served(floor)
 
 class Buliding(object):
 
-    def __init__(self, floors, elevators, passengers):
-        self.floors = [Floor(0, x) for x in range(0, floors)]
-        self.elevators = Elevators(1, floors)
-        self.passenger_count = passengers
-        self.passengers = set()
-        self.probabilities = Probability(PROBABILITY)
-
-        cprint(f'DECLARATION: Building created', 'magenta')
-
-    def new_passenger(self):
-        trip = self.probabilities.rand_unique(2, default=1)
-        passenger = Passenger(id(len(self.passengers)), trip[0], trip[1])
-
-        self.passengers.add(passenger)
-        cprint("BUILDING: New passenger {} from floor {} to floor {}".format(passenger.id, passenger.origin, passenger.destination), "blue")
-
-        self.floors[passenger.origin].add_passenger(passenger)
-        cprint("BUILDING: Passenger {} added to floor {}".format(passenger.id, passenger.origin), "blue")
-
-        direction = passenger.destination - passenger.origin > 0 if 1 else -1
-        should_call = False
-        if (self.floors[passenger.origin].called_up == False and direction == 1):
-            self.floors[passenger.origin].called_up = True
-            should_call = True
-        elif (self.floors[passenger.origin].called_down == False and direction == -1):
-            self.floors[passenger.origin].called_down = True
-            should_call = True
-        should_call and self.elevators.call(passenger.origin, direction)
-        should_call and cprint("BUILDING: Elevator called to floor {}".format(passenger.origin), "blue")
-
-        setTimeout(0.01, passenger.run)
-        time.sleep(math.floor(random() * 2))
+    def __init__(self, floors, elevators, passengers, sim, logic=ALGORITHIM):
+        self.sim = sim
+        self.events = sim.events
+        self.log = sim.log
+        self.elevators = Elevators(elevators, floors, logic, sim, sim.banks)
+        banks = self.elevators.banks
+        # with one bank its landings are the floors; with several, a floor only counts who is on it
+        self.floors = banks[0].landings if len(banks) == 1 else [Floor(0, x, sim.log) for x in range(0, floors)]
+        self.created = 0
+        self.inside = 0                   # passengers currently in the building
+        self.passengers = Passengers(sim)
+        self.probabilities = sim.probability
+        if (sim.arrivals is not None):
+            self.trips = TraceTrips(sim.arrivals, floors)
+        else:
+            self.trips = trip_source(sim.profile, sim.spec, floors, passengers, sim.streams.generator('arrivals'))
+        # a replayed trace brings its own passengers
+        self.passenger_count = len(self.trips) if isinstance(self.trips, TraceTrips) else passengers
+        self.started = False              # arrivals scheduled; a restored snapshot is already started
+
+        self.log.debug('DECLARATION: Building created', color='magenta')
+
+    def next_arrival(self):
+        # Trips are drawn in vectorized chunks; only the next arrival is ever scheduled
+        if (self.chunk_index == len(self.chunk[0])):
+            chunk = self.trips.next_chunk(self.passenger_count - self.drawn)
+            if (chunk is None):
+                return
+            self.drawn += len(chunk)
+            self.chunk = (chunk['time'].tolist(), chunk['origin'].tolist(), chunk['destination'].tolist())
+            self.chunk_index = 0
+        times, origins, destinations = self.chunk
+        i = self.chunk_index
+        self.chunk_index += 1
+        self.events.schedule_at(times[i], ARRIVAL, self.new_passenger, origins[i], destinations[i])
+
+    def new_passenger(self, origin, destination):
+        passenger = self.passengers.add(origin, destination, self.events.now())
+        self.created += 1
+        self.inside += 1
+        self.log.info("BUILDING: New passenger {} from floor {} to floor {}", passenger, origin, destination, color="blue")
+
+        floor = self.floors[origin]
+        floor.add_passenger(passenger)
+        self.log.debug("BUILDING: Passenger {} added to floor {}", passenger, origin, color="blue")
+
+        self.passengers.run(passenger)
+        self.next_arrival()
 
     def remove_passenger(self, passenger):
-        not passenger in self.passengers and cprint("BUILDING: Passenger {} is not in building".format(passenger.id), "red")
-        passenger in self.passengers and self.passengers.remove(passenger)
-        for floor in self.floors:
-            if passenger in floor.passengers:
-                floor.passengers.remove(passenger)
-        cprint("BUILDING: Passenger {} removed from building".format(passenger.id), "blue")
+        people = self.passengers
+        if (people.state[passenger] == LEFT):
+            self.log.warning("BUILDING: Passenger {} is not in building", passenger)
+            return
+        self.floors[people.location[passenger]].remove_passenger(passenger)
+        people.state[passenger] = LEFT
+        self.inside -= 1
+        self.log.info("BUILDING: Passenger {} removed from building", passenger, color="blue")
 
     def simulate(self):
-        for i in range(self.passenger_count):
-            self.new_passenger()
+        self.started = True
+        self.chunk = ([], [], [])
+        self.chunk_index = 0
+        self.drawn = 0
+        self.next_arrival()
+
+    def run(self, max_events=None):
+        self.started or self.simulate()
+        processed = self.events.run(max_events=max_events)
+        if (len(self.events) > 0):
+            self.log.warning('SIMULATION: event budget of {} exhausted with {} events pending', max_events, len(self.events))
         # print summary of each floor
         for floor in self.floors:
             floor.print_summary()
-        TERMINATE[0] = True
-
-    async def run_dispatcher(self):
-        setTimeout(0.01, self.elevators.simulate)
-        setTimeout(0.01, self.simulate)
-        for elevator in self.elevators.elevators:
-            setTimeout(0.01, elevator.run)
-        while True:
-            # check if all passengers are done
-            if (all(TERMINATE)):
-                break
-            await asyncio.sleep(1)
-            if len(self.passengers) == 0:
-                TERMINATE[0] = True
-                break
-
-    def run(self):
-        LOOP.run_until_complete(self.run_dispatcher())
-        LOOP.close()
-
-def run():
-    cprint(f'---- ELEVATOR SIMULATOR ----', 'cyan');
-    # Create a Building instance
-    global building
-    building = Buliding(FLOORS, ELEVATORS, PEOPLE)
-    # Expose floors
-    global floors
-    floors = building.floors
-    # expose elevators
-    global elevators
-    elevators = building.elevators
-    # Expose probability
-    global probability
-    probability = Probability(PROBABILITY)
-    # Run the simulation
-    building.run()
\ No newline at end of file
+        self.log.info('SIMULATION: {} events processed in {:.1f}s of virtual time', processed, self.events.now() / 1000, color='cyan')
+        return processed
+
+class Simulation(object):
+    # Everything one run owns. Entities reach each other through this object
+    # instead of module globals, so several simulations can live in one process.
+    def __init__(self, floors, elevators, people, logic=ALGORITHIM, seed=None, log=None, report_every=None, dwell=DWELL, profile=PROFILE, arrivals=None, banks=BANKS,
+                 capacity=CAPACITY, floor_delay=FLOOR_DELAY, door_delay=DOOR_DELAY):
+        self.streams = Streams(seed)
+        self.seed = self.streams.seed
+        self.events = EventQueue()
+        self.own_log = log is None
+        self.log = log or Logger(console=VERBOSE)
+        if (self.log.clock is None and self.log.level < OFF):
+            self.log.clock = self.events.clock
+        self.spec = probability_spec(floors)
+        self.probability = Probability(self.spec, self.streams.random('destinations'), self.log)
+        self.dwell = DwellTime(dwell, self.streams.generator('dwell'))
+        self.profile = profile
+        self.arrivals = arrivals                  # TRIP_DTYPE array shared with other runs, replaces the profile
+        self.banks = banks                        # elevator banks, see zones.py; "" for one bank of `elevators` cars
+        self.capacity = capacity                  # of every car
+        self.floor_delay = floor_delay
+        self.door_delay = door_delay
+        self.building = Buliding(floors, elevators, people, self, logic)
+        self.floors = self.building.floors
+        self.elevators = self.building.elevators
+        self.passengers = self.building.passengers
+        self.metrics = Metrics(self.elevators.elevators)
+        self.report_every = report_every          # ms between periodic metrics exports, None for none
+        self.snapshots = None                     # periodic Snapshots of this run, see snapshot.py
+        self.config = {'floors': floors, 'elevators': elevators, 'people': people, 'algorithm': logic,
+                       'dwell': dwell, 'profile': profile, 'banks': banks,
+                       'capacity': capacity, 'floor_delay': floor_delay, 'door_delay': door_delay}
+
+    def report(self):
+        summary = self.metrics.summary(self.events.now())
+        wait = summary['wait']
+        self.log.info('METRICS: {} trips, wait mean {} p50 {} p95 {} p99 {} max {} (ms)',
+                      summary['trips'], wait['mean'] and round(wait['mean']), wait['p50'], wait['p95'], wait['p99'], wait['max'],
+                      color='cyan', metrics=summary)
+        return summary
+
+    def report_periodically(self):
+        self.report()
+        # stop once nothing else is left to simulate, so the run can end
+        len(self.events) > 0 and self.events.schedule(self.report_every, METRICS, self.report_periodically)
+
+    def set_logic(self, logic):
+        for bank in self.elevators.banks:
+            bank.set_logic(logic)
+        self.config['algorithm'] = logic
+
+    def run(self, max_events=None):
+        # Runs to the end, or resumes a run restored from a snapshot
+        try:
+            self.report_every and not self.building.started and self.events.schedule(self.report_every, METRICS, self.report_periodically)
+            processed = self.building.run(max_events)
+            self.report()
+            return processed
+        finally:
+            self.log.flush()
+            self.own_log and self.log.close()
+
+def run(floors_count=FLOORS, elevators_count=ELEVATORS, people=PEOPLE, logic=ALGORITHIM, seed=None, verbose=VERBOSE, level=LOG_LEVEL, fmt=LOG_FORMAT, report_every=None, dwell=DWELL, profile=PROFILE, profiler=None, profile_out="profile", banks=BANKS, export=None, export_format="parquet",
+        capacity=CAPACITY, floor_delay=FLOOR_DELAY, door_delay=DOOR_DELAY):
+    # profiler: a profiling mode (phases, cprofile, sample) to run under, or None
+    # export: prefix of the columnar event and trip files to write, or None
+    log = Logger(level=level, console=verbose, fmt=fmt, path="log.jsonl" if fmt == "jsonl" else "log.txt")
+    log.info('---- ELEVATOR SIMULATOR ----', color='cyan')
+    sim = Simulation(floors_count, elevators_count, people, logic, seed, log, report_every, dwell, profile, banks=banks,
+                     capacity=capacity, floor_delay=floor_delay, door_delay=door_delay)
+    profiler = profiler and Profiler(profiler)
+    exporter = export and Exporter(export, export_format)
+    exporter and exporter.attach(sim)
+    try:
+        profiler.run(sim) if profiler else sim.run()
+    finally:
+        exporter and print("Exported {}".format(", ".join(exporter.close())))
+        log.close()
+    if profiler:
+        print(profiler.report())
+        print("Profile written to {}".format(", ".join(profiler.write(profile_out))))
+    return sim
@@ -0,0 +1,70 @@
+import heapq
+
+# Event kinds
+ARRIVAL = "arrival"
+HALL_CALL = "hall_call"
+DOOR_OPEN = "door_open"
+DOOR_CLOSE = "door_close"
+FLOOR_ARRIVAL = "floor_arrival"
+BOARDING = "boarding"
+ALIGHTING = "alighting"
+DEPARTURE = "departure"
+METRICS = "metrics"
+SNAPSHOT = "snapshot"
+
+class VirtualTime():
+    def __init__(self):
+        self.time = 0
+
+    def increment(self, amount):
+        self.time += amount
+
+    def set(self, time):
+        if time < self.time:
+            raise ValueError("Cannot move virtual time backwards from {} to {}".format(self.time, time))
+        self.time = time
+
+    def get(self):
+        return self.time
+
+class EventQueue(object):
+    # Priority queue of timestamped events (ms of virtual time).
+    # Events scheduled for the same instant run in the order they were
+    # scheduled, so a run is fully determined by its inputs and seed.
+    def __init__(self, clock=None):
+        self.clock = clock or VirtualTime()
+        self.heap = []
+        self.counter = 0
+        self.processed = 0
+
+    def __len__(self):
+        return len(self.heap)
+
+    def now(self):
+        return self.clock.get()
+
+    def schedule(self, delay, kind, callback, *args):
+        self.schedule_at(self.clock.get() + delay, kind, callback, *args)
+
+    def schedule_at(self, when, kind, callback, *args):
+        self.counter += 1
+        heapq.heappush(self.heap, (when, self.counter, kind, callback, args))
+
+    def step(self):
+        when, _, kind, callback, args = heapq.heappop(self.heap)
+        self.clock.set(when)
+        self.processed += 1
+        callback(*args)
+        return kind
+
+    def run(self, until=None, max_events=None):
+        # Process events up to virtual time `until` and at most `max_events`
+        # of them (counted over the queue's lifetime); returns events processed
+        heap = self.heap
+        while heap:
+            if until is not None and heap[0][0] > until:
+                break
+            if max_events is not None and self.processed >= max_events:
+                break
+            self.step()
+        return self.processed
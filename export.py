@@ -0,0 +1,170 @@
+import os
+import csv
+from functools import partial
+from hooks import Wrapper, Instrument
+from constants import IDLE
+from events import ARRIVAL, HALL_CALL, FLOOR_ARRIVAL, DOOR_OPEN, DOOR_CLOSE, BOARDING, ALIGHTING, DEPARTURE
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = None
+
+FORMATS = ('parquet', 'arrow', 'csv')
+BATCH_SIZE = 65536                        # rows per row group / record batch
+
+# (column, arrow type) of each table
+EVENTS = [('t', 'float64'), ('event', 'string'), ('bank', 'int32'), ('car', 'int32'), ('floor', 'int32'), ('passenger', 'int32'), ('direction', 'int8')]
+TRIPS = [('passenger', 'int32'), ('origin', 'int32'), ('destination', 'int32'), ('arrival', 'float64'),
+         ('board', 'float64'), ('alight', 'float64'), ('car', 'int32'), ('final', 'bool_')]
+
+class TableWriter(object):
+    # Streams rows to one columnar file: rows are buffered column-wise and
+    # written every `batch_size` rows as a Parquet row group or an Arrow
+    # record batch (or appended to a CSV), so memory stays bounded.
+    def __init__(self, path, columns, fmt='parquet', batch_size=BATCH_SIZE):
+        self.path = path
+        self.names = [name for name, _ in columns]
+        self.fmt = fmt
+        self.batch_size = batch_size
+        self.columns = [[] for _ in columns]
+        self.rows = 0
+        if fmt == 'csv':
+            self.file = open(path, "w", newline="")
+            self.csv = csv.writer(self.file)
+            self.csv.writerow(self.names)
+            return
+        self.schema = pa.schema([(name, getattr(pa, kind)()) for name, kind in columns])
+        if fmt == 'parquet':
+            self.writer = pq.ParquetWriter(path, self.schema)
+        else:
+            self.sink = pa.OSFile(path, "wb")
+            self.writer = pa.ipc.new_file(self.sink, self.schema)
+
+    def append(self, *row):
+        for column, value in zip(self.columns, row):
+            column.append(value)
+        if len(self.columns[0]) >= self.batch_size:
+            self.flush()
+
+    def flush(self):
+        count = len(self.columns[0])
+        if not count:
+            return
+        if self.fmt == 'csv':
+            self.csv.writerows(zip(*self.columns))
+        else:
+            batch = pa.record_batch([pa.array(column, type=field.type) for column, field in zip(self.columns, self.schema)], schema=self.schema)
+            if self.fmt == 'parquet':
+                self.writer.write_table(pa.Table.from_batches([batch]))
+            else:
+                self.writer.write_batch(batch)
+        self.rows += count
+        self.columns = [[] for _ in self.columns]
+
+    def close(self):
+        self.flush()
+        if self.fmt == 'csv':
+            self.file.close()
+        else:
+            self.writer.close()
+            self.fmt == 'arrow' and self.sink.close()
+
+class Hook(Wrapper):
+    # Reports every call of a method to an Exporter, as before(*args) and/or
+    # after(result, *args)
+    def __init__(self, method, before=None, after=None):
+        Wrapper.__init__(self, method)
+        self.before = before
+        self.after = after
+
+    def __call__(self, *args):
+        self.before is not None and self.before(*args)
+        result = self.method(*args)
+        self.after is not None and self.after(result, *args)
+        return result
+
+class Exporter(Instrument):
+    # Columnar export of one simulation: <prefix>-events.<fmt> holds every
+    # state transition (passengers starting to wait, hall calls, car
+    # arrivals, doors, boarding, alighting, departures, idling) and
+    # <prefix>-trips.<fmt> one row per ride (a trip with a transfer has one
+    # per leg; `final` marks the last). Like the profiler, it hooks the
+    # methods of that simulation's objects only (see hooks.py), so runs that
+    # are not exported pay nothing.
+    #   exporter = Exporter("run", "parquet")
+    #   exporter.run(sim)                 # or attach(sim), sim.run(), close()
+    # Parquet and Arrow need pyarrow; without it, ask for CSV.
+    def __init__(self, prefix, fmt='parquet', batch_size=BATCH_SIZE):
+        if fmt not in FORMATS:
+            raise ValueError("Export format {} is not supported".format(fmt))
+        Instrument.__init__(self)
+        if fmt != 'csv' and pa is None:
+            raise ImportError("Export format {} needs pyarrow; install it or export csv".format(fmt))
+        self.fmt = fmt
+        self.paths = ["{}-{}.{}".format(prefix, name, fmt) for name in ("events", "trips")]
+        directory = os.path.dirname(prefix)
+        directory and os.makedirs(directory, exist_ok=True)
+        self.events = TableWriter(self.paths[0], EVENTS, fmt, batch_size)
+        self.trips = TableWriter(self.paths[1], TRIPS, fmt, batch_size)
+        self.sim = None
+
+    def attach(self, sim):
+        self.sim = sim
+        people = sim.passengers
+        self.hook(people, 'run', Hook, before=self.waiting)
+        self.hook(people, 'boarded', Hook, after=self.boarded)
+        # a ride is recorded before dropped() moves the passenger on
+        self.hook(people, 'dropped', Hook, before=self.dropped)
+        for bank in sim.elevators.banks:
+            for floor in bank.zone:
+                landing = bank.landings[floor]
+                self.hook(landing, 'call_up', Hook, after=partial(self.called, landing, 1))
+                self.hook(landing, 'call_down', Hook, after=partial(self.called, landing, -1))
+        for car in sim.elevators.elevators:
+            self.hook(car, 'arrive', Hook, after=partial(self.car_event, FLOOR_ARRIVAL, car))
+            self.hook(car, 'door_opened', Hook, after=partial(self.car_event, DOOR_OPEN, car))
+            self.hook(car, 'door_closed', Hook, after=partial(self.car_event, DOOR_CLOSE, car))
+            self.hook(car, 'move', Hook, after=partial(self.departed, car))
+        return sim
+
+    def now(self):
+        return self.sim.events.now()
+
+    def waiting(self, id):
+        # a passenger starts waiting: new in the building, back from a floor, or at a transfer
+        people = self.sim.passengers
+        origin = people.origin[id]
+        self.events.append(self.now(), ARRIVAL, -1, -1, origin, id, 1 if people.destination[id] > origin else -1)
+
+    def boarded(self, result, id, car, now):
+        self.events.append(now, BOARDING, self.sim.elevators.elevators[car].bank.id, car, self.sim.passengers.origin[id], id, 0)
+
+    def dropped(self, id, floor, now):
+        people = self.sim.passengers
+        car = people.location[id]
+        self.trips.append(id, people.origin[id], floor, people.called_at[id], people.boarded_at[id], now, car, floor == people.destination[id])
+        self.events.append(now, ALIGHTING, self.sim.elevators.elevators[car].bank.id, car, floor, id, 0)
+
+    def called(self, landing, direction, result):
+        self.events.append(self.now(), HALL_CALL, landing.bank.id, -1, landing.floor, -1, direction)
+
+    def car_event(self, kind, car, result):
+        self.events.append(self.now(), kind, car.bank.id, car.id, car.current_floor, -1, car.direction)
+
+    def departed(self, car, result):
+        self.events.append(self.now(), DEPARTURE if car.state != IDLE else IDLE, car.bank.id, car.id, car.current_floor, -1, car.direction)
+
+    def run(self, sim, max_events=None):
+        self.attach(sim)
+        try:
+            return sim.run(max_events)
+        finally:
+            self.close()
+
+    def close(self):
+        self.detach()
+        self.events.close()
+        self.trips.close()
+        return self.paths
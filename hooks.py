@@ -0,0 +1,39 @@
+# Instruments (the profiler, the exporter) watch one simulation by replacing
+# bound methods of its objects with wrappers, set as instance attributes that
+# shadow the class methods. A simulation that is never instrumented runs the
+# plain methods at no cost, and detach() puts them back.
+
+def unwrapped(method):
+    return method
+
+class Wrapper(object):
+    # Stand-in for one bound method; subclasses do their work around
+    # self.method in __call__
+    def __init__(self, method):
+        self.method = method
+
+    def __reduce__(self):
+        # Pickled (e.g. into a snapshot) as the plain method underneath:
+        # instruments own open files and profilers, and stay behind
+        method = self.method
+        while isinstance(method, Wrapper):
+            method = method.method
+        return (unwrapped, (method,))
+
+
+class Instrument(object):
+    def __init__(self):
+        self.wrapped = []                 # (object, attribute) pairs hook() replaced
+
+    def hook(self, obj, name, wrapper, *args, **kwargs):
+        # Must run before sim.run(), which schedules the first bound methods
+        setattr(obj, name, wrapper(getattr(obj, name), *args, **kwargs))
+        self.wrapped.append((obj, name))
+
+    def detach(self):
+        # Put the original methods back, e.g. on a logger other runs share
+        for obj, name in reversed(self.wrapped):
+            wrapper = obj.__dict__.get(name)
+            if isinstance(wrapper, Wrapper):
+                setattr(obj, name, wrapper.method)
+        self.wrapped = []
@@ -0,0 +1,117 @@
+import json
+import atexit
+
+DEBUG = 10
+INFO = 20
+WARNING = 30
+ERROR = 40
+OFF = 100
+
+LEVELS = {
+    'debug': DEBUG,
+    'info': INFO,
+    'warning': WARNING,
+    'error': ERROR,
+    'off': OFF,
+}
+
+NAMES = {value: name for name, value in LEVELS.items()}
+
+COLORS = {
+    'red': '\033[91m',
+    'green': '\033[92m',
+    'yellow': '\033[93m',
+    'blue': '\033[94m',
+    'magenta': '\033[95m',
+    'cyan': '\033[96m',
+    'white': '\033[97m',
+    'reset': '\033[0m',
+}
+
+def noop(*args, **kwargs):
+    pass
+
+class Logger(object):
+    # Leveled simulation log.
+    # Messages are format strings with lazy arguments ("Floor {} called", floor),
+    # and the method of every disabled level is replaced by a no-op, so a
+    # filtered-out call costs one function call and nothing else.
+    # Lines are buffered and written through one open handle every
+    # `buffer_size` lines. fmt="jsonl"
+    # writes one object per line keyed on virtual time ("t", ms).
+    def __init__(self, level="info", path="log.txt", console=False, fmt="text", clock=None, buffer_size=512):
+        self.level = LEVELS[level] if isinstance(level, str) else level
+        self.path = path
+        self.console = console
+        self.fmt = fmt
+        self.clock = clock
+        self.buffer_size = buffer_size
+        self.buffer = []
+        self.file = None
+        if path and self.level < OFF:
+            self.file = open(path, "a")
+            atexit.register(self.close)
+        for name, value in LEVELS.items():
+            if value == OFF:
+                continue
+            if value < self.level or not (self.file or console):
+                setattr(self, name, noop)
+
+    def debug(self, text, *args, color='yellow', **fields):
+        self.emit(DEBUG, text, args, color, fields)
+
+    def info(self, text, *args, color='white', **fields):
+        self.emit(INFO, text, args, color, fields)
+
+    def warning(self, text, *args, color='red', **fields):
+        self.emit(WARNING, text, args, color, fields)
+
+    def error(self, text, *args, color='red', **fields):
+        self.emit(ERROR, text, args, color, fields)
+
+    def now(self):
+        return self.clock.get() if self.clock else 0
+
+    def emit(self, level, text, args, color, fields):
+        if args:
+            text = text.format(*args)
+        if self.console:
+            print(COLORS[color] + f"{text : <70}" + COLORS['red'] + f"{self.now() / 1000 : >68.3f}s" + COLORS['reset'])
+        if not self.file:
+            return
+        if self.fmt == "jsonl":
+            record = {"t": self.now(), "level": NAMES[level], "msg": text}
+            fields and record.update(fields)
+            self.buffer.append(json.dumps(record) + "\n")
+        else:
+            self.buffer.append(text + "\n")
+        if len(self.buffer) >= self.buffer_size:
+            self.flush()
+
+    def flush(self):
+        if not self.buffer or not self.file:
+            return
+        lines, self.buffer = self.buffer, []
+        self.file.write("".join(lines))
+
+    def close(self):
+        if not self.file:
+            return
+        self.flush()
+        self.file.close()
+        self.file = None
+        atexit.unregister(self.close)
+
+    def __getstate__(self):
+        # Open handles do not travel; a copied logger is silent
+        state = self.__dict__.copy()
+        state.update(file=None, buffer=[], path=None, console=False)
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        for name, value in LEVELS.items():
+            if value != OFF:
+                setattr(self, name, noop)
+
+SILENT = Logger(level="off", path=None)
@@ -1,17 +1,127 @@
 from elevator import *
+from batch import run_batch, load_configs, record_arrivals, resume
+from optimize import run_optimize, SLA, SLA_METRIC, ETA, RUNGS
+from compare import run_compare, replay
+from sweep import run_sweep, expand_grid
+from server import run_server, HOST, PORT, SPEED, RATE
+from replicate import run_replicate, METRICS, TOLERANCE, CONFIDENCE, MIN_RUNS, MAX_RUNS
+from dispatch import STRATEGIES
+from cache import CACHE_PATH
+from profiling import MODES
+from export import FORMATS
 import argparse
+import json
+import sys
 
-algos = ['fcfs', 'sjf', 'srtf', 'random', 'llf', 'edf', 'lifo']
+algos = list(STRATEGIES)
 def main():
     # usage: python main.py -f [FLOORS] -e [ELEVATORS] -p [PEOPLE] -a [ALGORITHM] -v
+    #        python main.py batch -f [FLOORS] ... --runs N --seed S --out results.jsonl
+    #        python main.py sweep -f 5 10 20 -e 1 2 4 -a random fcfs --runs N --out sweep.jsonl
+    #        python main.py record -f 20 -p 50000 -t office --seed S --out day.npy
+    #        python main.py replay -t day.npy -f 20 -e 4 -a fcfs eta --out results.jsonl
+    #        python main.py compare -f 20 -e 4 -p 5000 -a fcfs sjf eta --seed S
+    #        python main.py serve -f 20 -e 4 -p 5000 -t office --port 8080 --speed 60
+    #        python main.py batch -f 60 -e 12 -p 500000 -t office --snapshot-every 3600 --snapshot day-{n}-{t}.snap
+    #        python main.py resume --snapshot day-0-28800.snap --fork fcfs eta
+    #        python main.py replicate -f 20 -e 4 -p 2000 -a fcfs eta --tolerance 0.02 --max-runs 200
+    #        python main.py optimize -f 20 -e 2 3 4 5 6 8 -p 5000 -t office -a fcfs eta sjf --capacity 13 20 --sla 45
+    # -f/-e/-p/-a take several values in batch and sweep mode (one run per combination)
     # Parse arguments
     parser = argparse.ArgumentParser()
-    parser.add_argument("-f", "--floors", type=int, default=5, help="Number of floors")
-    parser.add_argument("-e", "--elevators", type=int, default=1, help="Number of elevators")
-    parser.add_argument("-p", "--people", type=int, default=10, help="Number of people")
-    parser.add_argument("-a", "--algorithm", type=str, default="random", help="Scheduling algorithm")
+    parser.add_argument("command", nargs="?", choices=["batch", "sweep", "record", "replay", "compare", "serve", "replicate", "resume", "optimize"], help="Run headless instead of the interactive prompt")
+    parser.add_argument("-f", "--floors", type=int, nargs="+", default=[5], help="Number of floors")
+    parser.add_argument("-e", "--elevators", type=int, nargs="+", default=[1], help="Number of elevators")
+    parser.add_argument("-p", "--people", type=int, nargs="+", default=[10], help="Number of people")
+    parser.add_argument("-a", "--algorithm", type=str, nargs="+", default=["random"], help="Scheduling algorithm")
+    parser.add_argument("-d", "--dwell", type=str, nargs="+", default=[DWELL], help="Dwell time between trips: uniform:LOW:HIGH, gaussian:MEAN:SD or exponential:MEAN (ms)")
+    parser.add_argument("-t", "--profile", type=str, nargs="+", default=[PROFILE], help="Traffic profile: static, office, up-peak, lunch, down-peak or a JSON file")
+    parser.add_argument("-b", "--banks", type=str, nargs="+", help="Elevator banks as CARS:FLOORS, e.g. 6:1-20 6:1,21-39 (replaces -e)")
+    parser.add_argument("--capacity", type=int, nargs="+", default=[CAPACITY], help="Passengers per car")
+    parser.add_argument("--floor-delay", type=int, nargs="+", default=[FLOOR_DELAY], help="Milliseconds a car takes per floor")
+    parser.add_argument("--door-delay", type=int, nargs="+", default=[DOOR_DELAY], help="Milliseconds to open or close the doors")
     parser.add_argument("-v", "--verbose", action="store_true", help="Verbose output")
+    parser.add_argument("--log-level", type=str, default="info", choices=["debug", "info", "warning", "error", "off"], help="Log level")
+    parser.add_argument("--log-format", type=str, default="text", choices=["text", "jsonl"], help="Log file format (jsonl is keyed on virtual time)")
+    parser.add_argument("--runs", type=int, help="Number of runs per configuration (batch)")
+    parser.add_argument("--seed", type=int, help="Base random seed (batch)")
+    parser.add_argument("--out", type=str, help="JSONL file for per-run results, stdout if omitted (batch)")
+    parser.add_argument("--max-events", type=int, help="Event budget per run; a run that hits it is reported incomplete (batch)")
+    parser.add_argument("--config", type=str, help="JSONL file with one run configuration per line (batch)")
+    parser.add_argument("--metrics-every", type=float, help="Also log metrics every N seconds of virtual time, not just at the end")
+    parser.add_argument("--cache", type=str, nargs="?", const=CACHE_PATH, help=f"Reuse results of identical runs from a result cache ({CACHE_PATH} if no path is given) (batch, sweep)")
+    parser.add_argument("--profile-mode", type=str, nargs="?", const="phases", choices=MODES, help="Time every simulation phase; cprofile or sample also run that profiler (run, batch)")
+    parser.add_argument("--profile-out", type=str, default="profile", help="Prefix of the profile files (.json summary, .folded flamegraph input, .prof)")
+    parser.add_argument("--export", type=str, help="Write every state transition and ride to <EXPORT>-events/-trips files (run, batch)")
+    parser.add_argument("--export-format", type=str, default="parquet", choices=FORMATS, help="Export as Parquet, Arrow IPC or CSV (Parquet and Arrow need pyarrow)")
+    parser.add_argument("--snapshot-every", type=float, help="Checkpoint every run every N seconds of virtual time (batch)")
+    parser.add_argument("--snapshot", type=str, help="Snapshot file, {n} is the run and {t} the virtual second (batch); the snapshot to resume (resume)")
+    parser.add_argument("--fork", type=str, nargs="+", choices=algos, help="Resume one branch per algorithm instead of the saved one (resume)")
+    parser.add_argument("--host", type=str, default=HOST, help="Address to listen on (serve)")
+    parser.add_argument("--port", type=int, default=PORT, help="Port to listen on (serve)")
+    parser.add_argument("--unix", type=str, help="Listen on this Unix socket instead (serve)")
+    parser.add_argument("--speed", type=float, default=SPEED, help="Virtual seconds per wall second, 0 for as fast as possible (serve)")
+    parser.add_argument("--rate", type=float, default=RATE, help="State updates streamed per second (serve)")
+    parser.add_argument("--tolerance", type=float, default=TOLERANCE, help="Stop once every confidence interval is within this fraction of its mean (replicate)")
+    parser.add_argument("--confidence", type=float, default=CONFIDENCE, help="Confidence level of the intervals (replicate)")
+    parser.add_argument("--min-runs", type=int, default=MIN_RUNS, help="Replications before stopping is considered (replicate)")
+    parser.add_argument("--max-runs", type=int, default=MAX_RUNS, help="Replication budget per configuration (replicate)")
+    parser.add_argument("--sla", type=float, default=SLA / 1000, help="Seconds the SLA metric must stay under (optimize)")
+    parser.add_argument("--sla-metric", type=str, default=SLA_METRIC, choices=METRICS, help="Metric the SLA is on (optimize)")
+    parser.add_argument("--eta", type=int, default=ETA, help="Each round keeps 1/ETA of the candidates and runs ETA times as many replications (optimize)")
+    parser.add_argument("--rungs", type=int, default=RUNGS, help="Rounds of successive halving (optimize)")
+    parser.add_argument("--workers", type=int, help="Worker processes, defaults to all cores (sweep, replicate)")
     args = parser.parse_args()
+    grid = {
+        'floors': args.floors,
+        'elevators': args.elevators,
+        'people': args.people,
+        'algorithm': [algorithm in algos and algorithm or "random" for algorithm in args.algorithm],
+        'dwell': args.dwell,
+        'profile': args.profile,
+        'banks': [";".join(args.banks or [])],
+        'capacity': args.capacity,
+        'floor_delay': args.floor_delay,
+        'door_delay': args.door_delay,
+    }
+
+    if args.command == "record":
+        args.out or parser.error("record needs --out")
+        count = record_arrivals(args.out, grid['profile'][0], grid['floors'][0], grid['people'][0], args.seed)
+        print("Recorded {} arrivals to {}".format(count, args.out))
+        return
+    if args.command == "replay":
+        sink = open(args.out, "w") if args.out else sys.stdout
+        for record in replay(grid['profile'][0], grid['algorithm'], grid['floors'][0], grid['elevators'][0], args.seed or 0,
+                             grid['dwell'][0], grid['banks'][0], grid['capacity'][0], grid['floor_delay'][0], grid['door_delay'][0]):
+            sink.write(json.dumps(record) + "\n")
+        sink is sys.stdout or sink.close()
+        return
+    if args.command == "compare":
+        config = {key: values[0] for key, values in grid.items()}
+        sys.exit(run_compare(config, grid['algorithm'], args.seed or 0, args.out, args.max_events))
+    if args.command == "serve":
+        sys.exit(run_server(expand_grid(grid, 1, args.seed or 0), args.host, args.port, args.unix, args.speed, args.rate))
+    if args.command == "resume":
+        args.snapshot or parser.error("resume needs --snapshot")
+        sys.exit(resume(args.snapshot, args.fork, args.out, args.max_events))
+    if args.command == "optimize":
+        # ms metrics are compared in ms, utilization as given
+        sla = args.sla * 1000 if args.sla_metric != "utilization" else args.sla
+        sys.exit(run_optimize(grid, sla, args.sla_metric, args.seed or 0, args.eta, args.rungs, args.out, args.workers, args.cache))
+    if args.command == "replicate":
+        sys.exit(run_replicate(grid, args.seed or 0, args.tolerance, args.confidence, args.min_runs, args.max_runs,
+                               args.out, args.workers, args.cache))
+    if args.command == "sweep":
+        sys.exit(run_sweep(grid, args.runs or 1, args.seed or 0, args.out, args.workers, args.cache))
+    if args.command == "batch" or args.runs or args.out or args.config:
+        if args.config:
+            configs = load_configs(args.config)
+        else:
+            configs = [(config, None, None) for config, _ in expand_grid(grid)]
+        sys.exit(run_batch(configs, args.runs or 1, args.seed, args.out, args.verbose, args.max_events, args.cache, args.profile_mode, args.profile_out,
+                           args.export, args.export_format, args.snapshot_every and args.snapshot_every * 1000,
+                           args.snapshot or "snapshot-{n}.snap"))
 
     # Set global variables
     global FLOORS
@@ -19,10 +129,10 @@ def main():
     global PEOPLE
     global ALGORITHM
     global VERBOSE
-    FLOORS = args.floors
-    ELEVATORS = args.elevators
-    PEOPLE = args.people
-    ALGORITHM = args.algorithm in algos and args.algorithm or "random"
+    FLOORS = grid['floors'][0]
+    ELEVATORS = grid['elevators'][0]
+    PEOPLE = grid['people'][0]
+    ALGORITHM = grid['algorithm'][0]
     VERBOSE = args.verbose
 
     while True:
@@ -30,7 +140,11 @@ def main():
         if cmd == "run":
             print("Running simulation...")
             print("Floors: {}, Elevators: {}, People: {}, Algorithm: {}".format(FLOORS, ELEVATORS, PEOPLE, ALGORITHM))
-            run()
+            run(FLOORS, ELEVATORS, PEOPLE, ALGORITHM, verbose=VERBOSE, level=args.log_level, fmt=args.log_format,
+                report_every=args.metrics_every and args.metrics_every * 1000, dwell=grid['dwell'][0],
+                profile=grid['profile'][0], profiler=args.profile_mode, profile_out=args.profile_out, banks=grid['banks'][0],
+                export=args.export, export_format=args.export_format, capacity=grid['capacity'][0],
+                floor_delay=grid['floor_delay'][0], door_delay=grid['door_delay'][0])
         elif cmd == "exit":
             break
         elif cmd.startswith("set -f"):
@@ -0,0 +1,121 @@
+from array import array
+
+class Histogram(object):
+    # HDR-style histogram of non-negative integer values (ms).
+    # Values below 2 * `half` get a bucket each; above that every power of two
+    # is split into `half` buckets, so any recorded value is reported within
+    # 1 / half of itself and memory grows with log(max value), never with the
+    # number of values recorded.
+    def __init__(self, precision=6):
+        self.half = 1 << precision
+        self.precision = precision
+        self.counts = array('q')
+        self.count = 0
+        self.total = 0
+        self.min = None
+        self.max = None
+
+    def index(self, value):
+        shift = value.bit_length() - self.precision - 1
+        if shift <= 0:
+            return value
+        return (shift + 1) * self.half + (value >> shift) - self.half
+
+    def bucket_value(self, index):
+        # midpoint of the values that land in bucket `index`
+        shift = index // self.half - 1
+        if shift <= 0:
+            return index
+        low = (index % self.half + self.half) << shift
+        return low + (1 << shift) // 2
+
+    def add(self, value):
+        value = int(round(value))
+        if value < 0:
+            raise ValueError("Histogram values must be non-negative, got {}".format(value))
+        index = self.index(value)
+        counts = self.counts
+        if index >= len(counts):
+            counts.extend([0] * (index + 1 - len(counts)))
+        counts[index] += 1
+        self.count += 1
+        self.total += value
+        if self.min is None or value < self.min:
+            self.min = value
+        if self.max is None or value > self.max:
+            self.max = value
+
+    def mean(self):
+        return self.total / self.count if self.count else None
+
+    def percentile(self, q):
+        # value at percentile q (0-100), None when empty
+        if not self.count:
+            return None
+        rank = max(1, int(q / 100.0 * self.count + 0.5))
+        seen = 0
+        for index, count in enumerate(self.counts):
+            seen += count
+            if seen >= rank:
+                return min(max(self.bucket_value(index), self.min), self.max)
+        return self.max
+
+    def summary(self):
+        return {
+            "count": self.count,
+            "mean": self.mean(),
+            "p50": self.percentile(50),
+            "p95": self.percentile(95),
+            "p99": self.percentile(99),
+            "max": self.max,
+        }
+
+class Metrics(object):
+    # Streaming aggregates of one run, in ms of virtual time.
+    # Finished trips feed the wait and ride histograms and the per-window
+    # throughput counts; every load change of a car adds load * time to that
+    # car's load integral. Memory does not depend on the passenger count.
+    def __init__(self, elevators, window=300000):
+        self.cars = elevators
+        self.window = window                      # throughput bucket (ms), 5 minutes
+        self.wait = Histogram()
+        self.ride = Histogram()
+        self.throughput = array('i')              # trips finished per window
+        count = len(elevators)
+        self.load = [0] * count
+        self.load_since = [0] * count
+        self.load_area = [0.0] * count            # integral of load over time (passenger ms)
+
+    def trip(self, wait, ride, now):
+        self.wait.add(wait)
+        self.ride.add(ride)
+        slot = int(now // self.window)
+        throughput = self.throughput
+        if slot >= len(throughput):
+            throughput.extend([0] * (slot + 1 - len(throughput)))
+        throughput[slot] += 1
+
+    def load_changed(self, elevator, now):
+        id = elevator.id
+        self.load_area[id] += self.load[id] * (now - self.load_since[id])
+        self.load[id] = elevator.load
+        self.load_since[id] = now
+
+    def summary(self, now):
+        # Export of everything collected up to `now`
+        utilization = []
+        load_factor = []
+        for car in self.cars:
+            area = self.load_area[car.id] + self.load[car.id] * (now - self.load_since[car.id])
+            utilization.append(min(1.0, car.time / now) if now else 0.0)
+            load_factor.append(area / (now * car.capacity) if now else 0.0)
+        return {
+            "t": now,
+            "trips": self.wait.count,
+            "wait": self.wait.summary(),
+            "ride": self.ride.summary(),
+            "window": self.window,
+            "throughput": self.throughput.tolist(),
+            "utilization": utilization,
+            "load_factor": load_factor,
+        }
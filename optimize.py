@@ -0,0 +1,123 @@
+import os
+import json
+import math
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from sweep import run_cell, expand_grid
+from replicate import measure, Running, CONFIDENCE
+from zones import parse_banks
+
+SLA = 45000                               # ms the SLA metric must stay under
+SLA_METRIC = "wait_p95"
+ETA = 3                                   # each rung keeps 1/ETA of the candidates, with ETA times the replications
+RUNGS = 3
+
+def fleet_size(config):
+    # Cars in a configuration, over every bank
+    return sum(count for count, _ in parse_banks(config['banks'], config['floors'], config['elevators']))
+
+class Candidate(object):
+    # One configuration and the replications of it run so far
+    def __init__(self, config):
+        self.config = config
+        self.cars = fleet_size(config)
+        self.stat = Running()
+        self.failed = 0
+
+    def add(self, record, metric):
+        values = measure(record)
+        if values is None:
+            self.failed += 1
+        else:
+            self.stat.add(values[metric])
+
+    def feasible(self, sla):
+        return not self.failed and self.stat.count > 0 and self.stat.mean <= sla
+
+    def rank(self, sla):
+        # Fewest cars among the configurations meeting the SLA, then the best
+        # metric; those missing it by how close they come
+        if self.feasible(sla):
+            return (0, self.cars, self.stat.mean)
+        return (1, self.failed, self.stat.mean if self.stat.count else math.inf, self.cars)
+
+    def describe(self, sla, confidence=CONFIDENCE):
+        return {"config": self.config, "cars": self.cars, "feasible": self.feasible(sla), "failed": self.failed,
+                "metric": self.stat.summary(confidence)}
+
+def optimize(grid, sla=SLA, metric=SLA_METRIC, seed=0, eta=ETA, rungs=RUNGS, workers=None, cache=None, sink=None, progress=None):
+    # Successive halving over every configuration of the grid: rung r runs
+    # each surviving candidate on seeds seed .. seed + eta**r - 1 (the same
+    # seeds for all, so they are compared on the same traffic) and keeps the
+    # best 1/eta of them by rank(). Most candidates get one cheap replication
+    # and only the contenders are run often enough to trust. Replications of
+    # a rung run across a process pool and are folded in seed order, so the
+    # outcome does not depend on which worker finishes first.
+    # Returns the summary; `sink` gets every record, `progress` every rung's.
+    candidates = [Candidate(config) for config, _ in expand_grid(grid)]
+    history = []
+    runs = 0
+    with ProcessPoolExecutor(max_workers=workers or os.cpu_count()) as pool:
+        for rung in range(rungs):
+            replications = eta ** rung
+            done = candidates[0].stat.count + candidates[0].failed
+            futures = {pool.submit(run_cell, candidate.config, seed + i, cache): (candidate, i)
+                       for candidate in candidates for i in range(done, replications)}
+            records = {}
+            for future in as_completed(futures):
+                record = future.result()
+                sink and sink.write(json.dumps(record) + "\n")
+                records[futures[future]] = record
+            for candidate in candidates:
+                for i in range(done, replications):
+                    candidate.add(records[candidate, i], metric)
+            runs += len(futures)
+            candidates.sort(key=lambda candidate: candidate.rank(sla))
+            entry = {"rung": rung, "candidates": len(candidates), "replications": replications,
+                     "best": candidates[0].describe(sla)}
+            history.append(entry)
+            progress and progress(entry)
+            if rung < rungs - 1:
+                candidates = candidates[:max(1, math.ceil(len(candidates) / eta))]
+    best = candidates[0]
+    return {
+        "sla": sla,
+        "metric": metric,
+        "seed": seed,
+        "runs": runs,
+        "feasible": best.feasible(sla),
+        "best": best.describe(sla),
+        "finalists": [candidate.describe(sla) for candidate in candidates],
+        "rungs": history,
+    }
+
+def report(summary):
+    best = summary["best"]
+    config = best["config"]
+    stat = best["metric"]
+    half = stat["half_width"]
+    lines = ["{} runs, {}: {} cars{} with {}, capacity {}, {} ms/floor, {} ms doors".format(
+        summary["runs"], "meets the SLA" if summary["feasible"] else "nothing meets the SLA, closest",
+        best["cars"], config['banks'] and " in banks " + config['banks'], config['algorithm'], config['capacity'],
+        config['floor_delay'], config['door_delay'])]
+    lines.append("  {} {:.4g} +/- {} over {} runs (SLA {:.4g})".format(
+        summary["metric"], stat["mean"], "-" if half is None else "{:.4g}".format(half), stat["n"], summary["sla"]))
+    for finalist in summary["finalists"][1:]:
+        lines.append("  then {} cars {} capacity {}: {} {:.4g}".format(
+            finalist["cars"], finalist["config"]['algorithm'], finalist["config"]['capacity'], summary["metric"], finalist["metric"]["mean"]))
+    return "\n".join(lines)
+
+def run_optimize(grid, sla=SLA, metric=SLA_METRIC, seed=0, eta=ETA, rungs=RUNGS, out=None, workers=None, cache=None):
+    # CLI entry point: prints the leader after every rung, then the answer;
+    # returns the exit status, 1 if no configuration meets the SLA
+    def progress(entry):
+        best = entry["best"]
+        print("rung {}: {} candidates x {} runs, best {} cars {} ({} {:.4g})".format(
+            entry["rung"], entry["candidates"], entry["replications"], best["cars"], best["config"]['algorithm'],
+            metric, best["metric"]["mean"]), flush=True)
+    sink = open(out, "w") if out else None
+    try:
+        summary = optimize(grid, sla, metric, seed, eta, rungs, workers, cache, sink, progress)
+    finally:
+        sink and sink.close()
+    print(report(summary))
+    return 0 if summary["feasible"] else 1
@@ -0,0 +1,171 @@
+import os
+import sys
+import json
+import time
+import pstats
+import cProfile
+import threading
+from collections import defaultdict
+from logger import SILENT
+from hooks import Wrapper, Instrument
+
+MODES = ('phases', 'cprofile', 'sample')
+
+class Timed(Wrapper):
+    # Counts calls of a method and adds the time spent in it, minus the time
+    # of timed calls nested inside, to its phase
+    def __init__(self, method, profiler, phase):
+        Wrapper.__init__(self, method)
+        self.profiler = profiler
+        self.phase = phase
+
+    def __call__(self, *args, **kwargs):
+        profiler = self.profiler
+        stack = profiler.stack
+        stack.append([self.phase, 0.0])
+        start = time.perf_counter()
+        try:
+            return self.method(*args, **kwargs)
+        finally:
+            elapsed = time.perf_counter() - start
+            path = ";".join(frame[0] for frame in stack)
+            inner = stack.pop()[1]
+            profiler.time[self.phase] += elapsed - inner
+            profiler.calls[self.phase] += 1
+            profiler.stacks[path] += elapsed - inner
+            if stack:
+                stack[-1][1] += elapsed
+
+class Sampler(object):
+    # Statistical profiler: a thread records the main thread's Python stack
+    # every `interval` seconds, as folded stacks ready for flamegraph.pl
+    def __init__(self, interval=0.001):
+        self.interval = interval
+        self.samples = defaultdict(int)
+        self.target = threading.main_thread().ident
+        self.running = False
+        self.thread = None
+
+    def start(self):
+        self.running = True
+        self.thread = threading.Thread(target=self.loop, daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        self.running = False
+        self.thread and self.thread.join()
+
+    def loop(self):
+        while self.running:
+            frame = sys._current_frames().get(self.target)
+            names = []
+            while frame is not None:
+                code = frame.f_code
+                names.append("{}:{}".format(os.path.basename(code.co_filename), code.co_name))
+                frame = frame.f_back
+            if names:
+                self.samples[";".join(reversed(names))] += 1
+            time.sleep(self.interval)
+
+class Profiler(Instrument):
+    # Per-phase counters and exclusive timers for one simulation.
+    # attach() wraps the hot methods of that simulation's objects in Timed
+    # (see hooks.py).
+    # mode="cprofile" also runs cProfile, mode="sample" a sampling profiler.
+    #   profiler = Profiler()
+    #   profiler.run(sim)                 # attach, time sim.run(), detach
+    #   print(profiler.report())
+    #   profiler.write("profile")
+    def __init__(self, mode='phases', interval=0.001):
+        if mode not in MODES:
+            raise ValueError("Profile mode {} is not supported".format(mode))
+        Instrument.__init__(self)
+        self.mode = mode
+        self.time = defaultdict(float)    # phase -> exclusive seconds
+        self.calls = defaultdict(int)
+        self.stacks = defaultdict(float)  # "phase;nested phase" -> exclusive seconds
+        self.stack = []
+        self.wall = 0.0
+        self.cprofile = cProfile.Profile() if mode == 'cprofile' else None
+        self.sampler = Sampler(interval) if mode == 'sample' else None
+
+    def wrap(self, obj, phase, *names):
+        for name in names:
+            self.hook(obj, name, Timed, self, phase)
+
+    def attach(self, sim):
+        building = sim.building
+        self.wrap(building, 'arrivals', 'next_arrival', 'new_passenger', 'remove_passenger')
+        self.wrap(sim.passengers, 'passengers', 'dropped', 'move')
+        for bank in sim.elevators.banks:
+            self.wrap(bank, 'dispatch', 'call', 'dispatch', 'served')
+        for elevator in sim.elevators.elevators:
+            self.wrap(elevator, 'travel', 'arrive', 'move')
+            self.wrap(elevator, 'doors', 'door_opened', 'door_closed')
+            self.wrap(elevator, 'boarding', 'board')
+            self.wrap(elevator, 'alighting', 'alight')
+        self.wrap(sim.metrics, 'metrics', 'trip', 'load_changed')
+        # the shared SILENT logger is left alone; it does no work to time
+        sim.log is not SILENT and self.wrap(sim.log, 'logging', 'debug', 'info', 'warning', 'error', 'flush')
+        return sim
+
+    def run(self, sim, max_events=None):
+        self.attach(sim)
+        try:
+            with self:
+                return sim.run(max_events)
+        finally:
+            self.detach()
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        self.cprofile and self.cprofile.enable()
+        self.sampler and self.sampler.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.sampler and self.sampler.stop()
+        self.cprofile and self.cprofile.disable()
+        self.wall += time.perf_counter() - self.start
+
+    def summary(self):
+        # Seconds per phase; "engine" is whatever ran outside every phase
+        # (the event loop itself, scheduling)
+        phases = {phase: {"seconds": seconds, "calls": self.calls[phase], "share": seconds / self.wall if self.wall else None}
+                  for phase, seconds in sorted(self.time.items(), key=lambda item: -item[1])}
+        engine = self.wall - sum(self.time.values())
+        phases["engine"] = {"seconds": engine, "calls": None, "share": engine / self.wall if self.wall else None}
+        return {"mode": self.mode, "wall": self.wall, "phases": phases}
+
+    def folded(self):
+        # Folded stacks (one "a;b;c weight" line each) for flamegraph.pl or
+        # speedscope: sampled Python stacks in sample mode, else phase stacks
+        # weighted in microseconds
+        if self.sampler:
+            return ["{} {}".format(stack, count) for stack, count in sorted(self.sampler.samples.items())]
+        lines = ["simulation;{} {}".format(stack, int(seconds * 1e6)) for stack, seconds in sorted(self.stacks.items())]
+        engine = self.wall - sum(self.time.values())
+        lines.append("simulation;engine {}".format(int(max(0.0, engine) * 1e6)))
+        return lines
+
+    def report(self):
+        summary = self.summary()
+        lines = ["{:<12} {:>10} {:>12} {:>7}".format("phase", "seconds", "calls", "share")]
+        for phase, entry in summary["phases"].items():
+            lines.append("{:<12} {:>10.4f} {:>12} {:>6.1f}%".format(
+                phase, entry["seconds"], "-" if entry["calls"] is None else entry["calls"], 100 * (entry["share"] or 0)))
+        lines.append("{:<12} {:>10.4f}".format("total", summary["wall"]))
+        return "\n".join(lines)
+
+    def write(self, prefix):
+        # prefix.json (summary), prefix.folded (flamegraph input) and, with
+        # cProfile, prefix.prof (for pstats/snakeviz); returns the paths
+        paths = [prefix + ".json", prefix + ".folded"]
+        with open(paths[0], "w") as f:
+            json.dump(self.summary(), f, indent=1)
+        with open(paths[1], "w") as f:
+            f.write("\n".join(self.folded()) + "\n")
+        if self.cprofile:
+            paths.append(prefix + ".prof")
+            pstats.Stats(self.cprofile).dump_stats(paths[-1])
+        return paths
@@ -0,0 +1,145 @@
+import os
+import json
+import math
+from statistics import NormalDist
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+from sweep import run_cell, expand_grid
+
+try:
+    from scipy.stats import t as student_t
+except ImportError:
+    student_t = None
+
+# Replicated metrics: name -> function of a result record
+METRICS = {
+    "wait_mean": lambda r: r["metrics"]["wait"]["mean"],
+    "wait_p95": lambda r: r["metrics"]["wait"]["p95"],
+    "ride_mean": lambda r: r["metrics"]["ride"]["mean"],
+    "utilization": lambda r: sum(r["metrics"]["utilization"]) / len(r["metrics"]["utilization"]),
+}
+
+def measure(record):
+    # METRICS of one run, or None if the run failed or left a metric
+    # undefined (no trip finished, so there is no mean wait)
+    if record.get("error") or not record["completed"]:
+        return None
+    values = {name: value(record) for name, value in METRICS.items()}
+    return None if None in values.values() else values
+
+TOLERANCE = 0.05                          # CI half-width, relative to the mean
+CONFIDENCE = 0.95
+MIN_RUNS = 5
+MAX_RUNS = 100
+
+def critical(confidence, df):
+    # Two-sided Student t critical value; without scipy, the Cornish-Fisher
+    # expansion around the normal quantile (within 1% from df = 3 up)
+    if student_t is not None:
+        return float(student_t.ppf(0.5 + confidence / 2, df))
+    z = NormalDist().inv_cdf(0.5 + confidence / 2)
+    return (z + (z ** 3 + z) / (4 * df) + (5 * z ** 5 + 16 * z ** 3 + 3 * z) / (96 * df ** 2)
+            + (3 * z ** 7 + 19 * z ** 5 + 17 * z ** 3 - 15 * z) / (384 * df ** 3))
+
+class Running(object):
+    # Running mean and variance of one metric (Welford), in O(1) memory
+    def __init__(self):
+        self.count = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+
+    def add(self, value):
+        self.count += 1
+        delta = value - self.mean
+        self.mean += delta / self.count
+        self.m2 += delta * (value - self.mean)
+
+    def variance(self):
+        return self.m2 / (self.count - 1) if self.count > 1 else None
+
+    def half_width(self, confidence=CONFIDENCE):
+        if self.count < 2:
+            return None
+        return critical(confidence, self.count - 1) * math.sqrt(self.variance() / self.count)
+
+    def converged(self, tolerance, confidence=CONFIDENCE):
+        half = self.half_width(confidence)
+        return half is not None and half <= tolerance * abs(self.mean)
+
+    def summary(self, confidence=CONFIDENCE):
+        half = self.half_width(confidence)
+        return {"mean": self.mean, "half_width": half, "low": half and self.mean - half,
+                "high": half and self.mean + half, "n": self.count}
+
+def replicate(config, seed=0, tolerance=TOLERANCE, confidence=CONFIDENCE, min_runs=MIN_RUNS, max_runs=MAX_RUNS,
+              workers=None, cache=None, sink=None):
+    # Independent replications (seeds seed, seed + 1, ...) run across a process
+    # pool until the confidence interval of every METRIC is within `tolerance`
+    # of its mean, or `max_runs` are used. Results are folded in seed order,
+    # so where a run stops does not depend on which worker finishes first;
+    # replications already started past that point are discarded.
+    # Returns the summary; `sink` gets every counted replication's record.
+    stats = {name: Running() for name in METRICS}
+    workers = min(workers or os.cpu_count(), max_runs)
+    done = {}                             # replication -> record, waiting for its turn
+    counted = 0
+    errors = 0
+    submitted = 0
+    converged = False
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        running = {}
+        while not converged and counted + errors < max_runs:
+            while submitted < max_runs and len(running) < workers:
+                running[pool.submit(run_cell, config, seed + submitted, cache)] = submitted
+                submitted += 1
+            finished, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in finished:
+                done[running.pop(future)] = future.result()
+            while counted + errors in done and not converged:
+                record = done.pop(counted + errors)
+                values = measure(record)
+                if values is None:
+                    errors += 1
+                    continue
+                counted += 1
+                for name, value in values.items():
+                    stats[name].add(value)
+                sink and sink.write(json.dumps(record) + "\n")
+                converged = counted >= min_runs and all(stat.converged(tolerance, confidence) for stat in stats.values())
+        for future in running:
+            future.cancel()
+    return {
+        "config": config,
+        "seed": seed,
+        "replications": counted,
+        "failed": errors,
+        "converged": converged,
+        "tolerance": tolerance,
+        "confidence": confidence,
+        "metrics": {name: stat.summary(confidence) for name, stat in stats.items()},
+    }
+
+def report(summary):
+    lines = ["{} replications ({} failed), {} at {:.0%} +/- {:.1%}".format(
+        summary["replications"], summary["failed"], "converged" if summary["converged"] else "budget used up",
+        summary["confidence"], summary["tolerance"])]
+    for name, entry in summary["metrics"].items():
+        half = entry["half_width"]
+        lines.append("  {:<12} {:>12.4g} +/- {}".format(name, entry["mean"], "-" if half is None else "{:.4g}".format(half)))
+    return "\n".join(lines)
+
+def run_replicate(grid, seed=0, tolerance=TOLERANCE, confidence=CONFIDENCE, min_runs=MIN_RUNS, max_runs=MAX_RUNS,
+                  out=None, workers=None, cache=None):
+    # CLI entry point: replicates every configuration of the grid, prints a
+    # summary each and writes the replications to `out`; returns the exit
+    # status, 1 if any configuration did not converge
+    status = 0
+    sink = open(out, "w") if out else None
+    try:
+        for config, _ in expand_grid(grid):
+            summary = replicate(config, seed, tolerance, confidence, min_runs, max_runs, workers, cache, sink)
+            print(json.dumps(config))
+            print(report(summary), flush=True)
+            status = status or (0 if summary["converged"] else 1)
+    finally:
+        sink and sink.close()
+    return status
@@ -0,0 +1,231 @@
+import json
+import asyncio
+from urllib.parse import urlsplit, parse_qs
+from elevator import Simulation
+from logger import SILENT
+from batch import CONFIG_KEYS, cars
+
+# usage: python main.py serve -f 20 -e 4 -p 5000 -t office [--port 8080] [--unix PATH] [--speed 60] [--rate 10]
+#   GET    /sims                 list of running and finished simulations
+#   POST   /sims?floors=20&...   start one (any CONFIG_KEYS, seed, speed, rate); returns its id
+#   GET    /sims/<id>            current state
+#   GET    /sims/<id>/stream     server-sent events: the full state, then deltas
+#   DELETE /sims/<id>            stop it
+# Every simulation is one asyncio task on the server's loop, so any number of
+# them run side by side in one process.
+
+HOST = "127.0.0.1"
+PORT = 8080
+SPEED = 60.0                              # virtual seconds per wall second, 0 for as fast as possible
+RATE = 10.0                               # state frames per wall second
+SLICE = 20000                             # events per slice when running as fast as possible
+
+def state(sim, done=False):
+    # What a viewer sees: car positions, waiting queue lengths, running metrics.
+    # Keys are strings so a state survives a JSON round trip unchanged.
+    now = sim.events.now()
+    metrics = sim.metrics.summary(now)
+    return {
+        "t": now,
+        "done": done,
+        "cars": {str(car.id): {"floor": car.current_floor, "target": car.target, "state": car.state,
+                               "direction": car.direction, "load": car.load} for car in sim.elevators.elevators},
+        "floors": {str(floor): dict(zip(("up", "down"), sim.elevators.waiting_at(floor))) for floor in range(1, len(sim.floors))},
+        "metrics": {"trips": metrics["trips"], "wait": metrics["wait"], "ride": metrics["ride"],
+                    "utilization": metrics["utilization"], "load_factor": metrics["load_factor"]},
+        "inside": sim.building.inside,
+    }
+
+def delta(old, new):
+    # The keys of `new` that differ from `old`, recursing into dicts
+    changes = {}
+    for key, value in new.items():
+        before = old.get(key)
+        if isinstance(value, dict) and isinstance(before, dict):
+            inner = delta(before, value)
+            if inner:
+                changes[key] = inner
+        elif value != before:
+            changes[key] = value
+    return changes
+
+def merge(into, update):
+    # Fold a later delta into an earlier one, so the result applies as both
+    for key, value in update.items():
+        if isinstance(value, dict) and isinstance(into.get(key), dict):
+            merge(into[key], value)
+        else:
+            into[key] = value
+    return into
+
+class Viewer(object):
+    # One streaming client. The simulation never waits for it: frames are
+    # merged into `pending` and the viewer's own task sends whatever has
+    # piled up once the socket drains, so a slow viewer gets fewer, larger
+    # deltas instead of holding the run back.
+    def __init__(self, writer):
+        self.writer = writer
+        self.pending = {}
+        self.ready = asyncio.Event()
+        self.merged = 0                   # frames folded into a later one
+
+    def push(self, update):
+        if self.pending:
+            self.merged += 1
+        merge(self.pending, update)
+        self.ready.set()
+
+    async def stream(self):
+        while True:
+            await self.ready.wait()
+            self.ready.clear()
+            frame, self.pending = self.pending, {}
+            self.writer.write("data: {}\n\n".format(json.dumps(frame)).encode())
+            await self.writer.drain()
+            if frame.get("done"):
+                return
+
+class LiveSimulation(object):
+    # A Simulation driven by an asyncio task in slices of virtual time: each
+    # frame (1/rate s of wall time) advances it speed/rate seconds and
+    # publishes the state delta to every viewer.
+    def __init__(self, id, config, seed=None, speed=SPEED, rate=RATE):
+        self.id = id
+        self.config = config
+        self.speed = speed
+        self.rate = rate
+        self.sim = Simulation(config['floors'], config['elevators'], config['people'], config['algorithm'], seed, SILENT,
+                              dwell=config['dwell'], profile=config['profile'], banks=config['banks'],
+                              **cars(config))
+        self.state = state(self.sim)
+        self.viewers = set()
+        self.task = None
+
+    def describe(self):
+        return {"id": self.id, "config": self.config, "seed": self.sim.seed, "speed": self.speed, "rate": self.rate,
+                "t": self.state["t"], "done": self.state["done"], "viewers": len(self.viewers)}
+
+    def start(self):
+        self.sim.building.simulate()
+        self.task = asyncio.get_running_loop().create_task(self.run())
+        return self
+
+    async def run(self):
+        loop = asyncio.get_running_loop()
+        events = self.sim.events
+        frame = 1.0 / self.rate
+        until = 0.0
+        try:
+            while len(events):
+                start = loop.time()
+                if self.speed:
+                    until += self.speed * 1000 * frame
+                    events.run(until=until)
+                else:
+                    events.run(max_events=events.processed + SLICE)
+                self.publish()
+                await asyncio.sleep(max(0.0, frame - (loop.time() - start)) if self.speed else 0)
+        finally:
+            self.publish(done=True)
+
+    def publish(self, done=False):
+        current = state(self.sim, done)
+        update = delta(self.state, current)
+        self.state = current
+        for viewer in self.viewers:
+            viewer.push(update)
+
+    async def watch(self, writer):
+        viewer = Viewer(writer)
+        viewer.push(self.state)
+        if not self.state["done"]:
+            self.viewers.add(viewer)
+        try:
+            await viewer.stream()
+        finally:
+            self.viewers.discard(viewer)
+
+    def stop(self):
+        self.task and self.task.cancel()
+
+class Server(object):
+    # Minimal HTTP/1.1 front end on asyncio streams (TCP or a Unix socket)
+    def __init__(self, speed=SPEED, rate=RATE):
+        self.speed = speed
+        self.rate = rate
+        self.sims = {}
+        self.count = 0
+
+    def start(self, config, seed=None, speed=None, rate=None):
+        config = {key: config.get(key, default) for key, default in CONFIG_KEYS.items()}
+        live = LiveSimulation(self.count, config, seed, self.speed if speed is None else speed, rate or self.rate)
+        self.sims[live.id] = live.start()
+        self.count += 1
+        return live
+
+    async def handle(self, reader, writer):
+        try:
+            request = (await reader.readline()).decode().split()
+            while (await reader.readline()) not in (b"\r\n", b"\n", b""):
+                pass
+            if len(request) < 2:
+                return
+            method, target = request[0], urlsplit(request[1])
+            path = [part for part in target.path.split("/") if part]
+            query = {key: values[-1] for key, values in parse_qs(target.query).items()}
+            await self.route(method, path, query, writer)
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+    async def route(self, method, path, query, writer):
+        if path == ["sims"] and method == "GET":
+            return await self.reply(writer, 200, [live.describe() for live in self.sims.values()])
+        if path == ["sims"] and method == "POST":
+            try:
+                config = {key: type(default)(query[key]) for key, default in CONFIG_KEYS.items() if key in query}
+                live = self.start(config, query.get("seed") and int(query["seed"]),
+                                  query.get("speed") and float(query["speed"]), query.get("rate") and float(query["rate"]))
+            except Exception as e:
+                # a bad parameter, profile or trace: whatever building the run raised
+                return await self.reply(writer, 400, {"error": str(e)})
+            return await self.reply(writer, 201, live.describe())
+        live = len(path) >= 2 and path[0] == "sims" and path[1].isdigit() and self.sims.get(int(path[1]))
+        if not live:
+            return await self.reply(writer, 404, {"error": "not found"})
+        if len(path) == 2 and method == "GET":
+            return await self.reply(writer, 200, live.state)
+        if len(path) == 2 and method == "DELETE":
+            live.stop()
+            return await self.reply(writer, 200, live.describe())
+        if path[2:] == ["stream"] and method == "GET":
+            writer.write(b"HTTP/1.1 200 OK\r\nContent-Type: text/event-stream\r\nCache-Control: no-cache\r\nConnection: close\r\n\r\n")
+            return await live.watch(writer)
+        return await self.reply(writer, 405, {"error": "method not allowed"})
+
+    async def reply(self, writer, status, body):
+        data = json.dumps(body).encode()
+        reason = {200: "OK", 201: "Created", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed"}[status]
+        writer.write("HTTP/1.1 {} {}\r\nContent-Type: application/json\r\nContent-Length: {}\r\nConnection: close\r\n\r\n".format(
+            status, reason, len(data)).encode() + data)
+        await writer.drain()
+
+    async def serve(self, host=HOST, port=PORT, unix=None, configs=()):
+        for config, seed in configs:
+            self.start(config, seed)
+        if unix:
+            server = await asyncio.start_unix_server(self.handle, unix)
+        else:
+            server = await asyncio.start_server(self.handle, host, port)
+        print("Serving {} simulations on {}".format(len(self.sims), unix or "http://{}:{}".format(host, port)), flush=True)
+        async with server:
+            await server.serve_forever()
+
+def run_server(configs, host=HOST, port=PORT, unix=None, speed=SPEED, rate=RATE):
+    # CLI entry point; configs: (config, seed) pairs to start right away
+    try:
+        asyncio.run(Server(speed, rate).serve(host, port, unix, configs))
+    except KeyboardInterrupt:
+        pass
+    return 0
@@ -0,0 +1,71 @@
+import os
+import zlib
+import pickle
+from events import SNAPSHOT
+
+# A snapshot is the whole Simulation pickled (clock, pending events, landings,
+# cars and their stop queues, passengers, RNG states, metrics) and
+# zlib-compressed behind a magic header. Pending events are bound methods of
+# the simulation's own objects, so they travel with it, and a restored run
+# carries on exactly where the original was. Loggers come back silent, and
+# profilers and exporters attached to the run are left behind.
+MAGIC = b"ELEVSNAP1\n"
+LEVEL = 1                                 # zlib level: snapshots are taken often, speed beats size
+
+def dumps(sim):
+    return MAGIC + zlib.compress(pickle.dumps(sim, pickle.HIGHEST_PROTOCOL), LEVEL)
+
+def loads(data):
+    if not data.startswith(MAGIC):
+        raise ValueError("Not a simulation snapshot")
+    return pickle.loads(zlib.decompress(data[len(MAGIC):]))
+
+def save(sim, path):
+    # Written to a temporary file and renamed, so a crash mid-write leaves the previous snapshot
+    data = dumps(sim)
+    directory = os.path.dirname(path)
+    directory and os.makedirs(directory, exist_ok=True)
+    with open(path + ".tmp", "wb") as f:
+        f.write(data)
+    os.replace(path + ".tmp", path)
+    return path
+
+def load(path):
+    with open(path, "rb") as f:
+        return loads(f.read())
+
+def fork(snapshot, logic):
+    # A branch of a snapshot (path or bytes) run by another dispatch algorithm
+    # from here on; its own periodic snapshots get the algorithm in their name
+    sim = load(snapshot) if isinstance(snapshot, str) else loads(snapshot)
+    sim.set_logic(logic)
+    sim.snapshots and sim.snapshots.branch(logic)
+    return sim
+
+class Snapshots(object):
+    # Saves `sim` every `every` ms of virtual time to `path`, which may hold
+    # "{t}" (virtual seconds) to keep every snapshot instead of the latest.
+    # The next snapshot is scheduled before this one is written, so it is
+    # part of the snapshot and a resumed run goes on taking them.
+    def __init__(self, sim, every, path):
+        self.sim = sim
+        self.every = every
+        self.path = path
+        self.taken = 0
+        sim.snapshots = self
+
+    def branch(self, name):
+        # snap-{t}.snap -> snap-{t}-name.snap, so branches keep their own files
+        root, ext = os.path.splitext(self.path)
+        self.path = "{}-{}{}".format(root, name, ext)
+
+    def start(self):
+        self.sim.events.schedule(self.every, SNAPSHOT, self.take)
+        return self
+
+    def take(self):
+        events = self.sim.events
+        # stop once nothing else is left to simulate, so the run can end
+        len(events) > 0 and events.schedule(self.every, SNAPSHOT, self.take)
+        self.taken += 1
+        return save(self.sim, self.path.format(t=int(events.now() // 1000)))
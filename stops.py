@@ -0,0 +1,123 @@
+UP = 1
+DOWN = -1
+CABIN = 0
+
+def lowest(bits):
+    # index of the lowest set bit
+    return (bits & -bits).bit_length() - 1
+
+def highest(bits):
+    # index of the highest set bit
+    return bits.bit_length() - 1
+
+def popcount(bits):
+    return bin(bits).count("1")
+
+def span(bits, low, high):
+    # number of set bits from index low to high, both included
+    return popcount((bits >> low) & ((1 << (high - low + 1)) - 1))
+
+class StopQueue(object):
+    # LOOK stop index for one car.
+    # Cabin calls and up/down hall calls are kept as one bitset each (bit n is
+    # floor n), so membership, insertion and removal are O(1) and "nearest
+    # stop above/below" is a shift plus a lowest/highest-bit lookup.
+    def __init__(self):
+        self.cabin = 0
+        self.up = 0
+        self.down = 0
+        self.all = 0
+        self.count = 0
+
+    def __len__(self):
+        return self.count
+
+    def __contains__(self, floor):
+        return self.has(floor)
+
+    def __iter__(self):
+        bits = self.all
+        while bits:
+            floor = lowest(bits)
+            yield floor
+            bits &= bits - 1
+
+    def __repr__(self):
+        return repr(list(self))
+
+    def has(self, floor):
+        return (self.all >> floor) & 1 == 1
+
+    def add(self, floor, direction=CABIN):
+        bit = 1 << floor
+        if direction == UP:
+            self.up |= bit
+        elif direction == DOWN:
+            self.down |= bit
+        else:
+            self.cabin |= bit
+        if not self.all & bit:
+            self.all |= bit
+            self.count += 1
+
+    def clear(self, floor):
+        bit = 1 << floor
+        if self.all & bit:
+            mask = ~bit
+            self.cabin &= mask
+            self.up &= mask
+            self.down &= mask
+            self.all &= mask
+            self.count -= 1
+
+    def above(self, bits, floor):
+        # bits strictly above floor, re-based so bit 0 is floor + 1
+        return bits >> (floor + 1)
+
+    def below(self, bits, floor):
+        return bits & ((1 << floor) - 1)
+
+    def next_stop(self, current, direction):
+        # Next floor to stop at when at `current` moving in `direction`:
+        # the current floor if it has a stop, else the nearest cabin call or
+        # same-direction hall call ahead, else the farthest opposite hall call
+        # ahead (where the car turns around), else the same search behind.
+        # Returns None when there are no stops.
+        if self.count == 0:
+            return None
+        if self.has(current):
+            return current
+        if direction == 0:
+            up = self.above(self.all, current)
+            down = self.below(self.all, current)
+            if not down:
+                return current + 1 + lowest(up)
+            if not up:
+                return highest(down)
+            nearest_up = current + 1 + lowest(up)
+            nearest_down = highest(down)
+            return nearest_up if nearest_up - current <= current - nearest_down else nearest_down
+        for heading in (direction, -direction):
+            if heading == UP:
+                ahead = self.above(self.cabin | self.up, current)
+                if ahead:
+                    return current + 1 + lowest(ahead)
+                turn = self.above(self.down, current)
+                if turn:
+                    return current + 1 + highest(turn)
+            else:
+                ahead = self.below(self.cabin | self.down, current)
+                if ahead:
+                    return highest(ahead)
+                turn = self.below(self.up, current)
+                if turn:
+                    return lowest(turn)
+        return None
+
+    def should_reverse(self, current, direction):
+        # True when nothing is left ahead in `direction`
+        if direction == UP:
+            return self.above(self.all, current) == 0
+        if direction == DOWN:
+            return self.below(self.all, current) == 0
+        return False
@@ -0,0 +1,23 @@
+from random import Random
+import numpy as np
+
+class Streams(object):
+    # Independent random streams of one run, all spawned from the run's seed.
+    # Each subsystem draws from its own stream, so two runs with the same seed
+    # are identical and drawing more of one thing (say, dwell times) never
+    # shifts another (arrivals). With seed=None fresh entropy is drawn and
+    # kept in `seed`, so the run can still be repeated.
+    names = ('arrivals', 'destinations', 'dwell')
+
+    def __init__(self, seed=None):
+        root = np.random.SeedSequence(seed)
+        self.seed = root.entropy
+        self.children = dict(zip(self.names, root.spawn(len(self.names))))
+
+    def generator(self, name):
+        # numpy Generator for vectorized draws
+        return np.random.default_rng(self.children[name])
+
+    def random(self, name):
+        # stdlib Random for code that draws one value at a time
+        return Random(int.from_bytes(self.children[name].generate_state(4).tobytes(), 'little'))
@@ -0,0 +1,87 @@
+import os
+import json
+import itertools
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from batch import simulate, CONFIG_KEYS
+from cache import ResultCache
+
+def expand_grid(grid, runs=1, seed=0):
+    # grid: {key: [values]} over CONFIG_KEYS; missing keys use their defaults.
+    # Run i of every cell uses seed + i, so configurations are compared on the
+    # same random streams and a cell is identified by (config, seed).
+    keys = list(CONFIG_KEYS)
+    values = [grid.get(key) or [CONFIG_KEYS[key]] for key in keys]
+    cells = []
+    for combination in itertools.product(*values):
+        config = dict(zip(keys, combination))
+        for i in range(runs):
+            cells.append((config, seed + i))
+    return cells
+
+def cell_key(config, seed):
+    # records written before a key existed hold its default
+    return tuple(config.get(key, default) for key, default in CONFIG_KEYS.items()) + (seed,)
+
+def finished_cells(path):
+    # Keys of the cells already present in a (possibly truncated) output file
+    done = set()
+    if not os.path.exists(path):
+        return done
+    with open(path) as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                continue                  # partially written last line
+            if "error" not in record:
+                done.add(cell_key(record["config"], record["seed"]))
+    return done
+
+def run_cell(config, seed, cache=None):
+    # Runs in a worker process; each opens its own connection to the cache
+    cache = cache and ResultCache(cache)
+    try:
+        return simulate(config, seed, cache=cache)
+    except Exception as e:
+        return {"config": config, "seed": seed, "error": repr(e)}
+    finally:
+        cache and cache.close()
+
+def sweep(grid, runs=1, seed=0, out=None, workers=None, cache=None):
+    # Runs every cell of the grid across a process pool and yields each
+    # record as soon as it finishes. With `out`, records are appended to the
+    # file and cells already in it are skipped, so an interrupted sweep resumes.
+    # With `cache` (a ResultCache path) only cells never run before are computed.
+    cells = expand_grid(grid, runs, seed)
+    if out:
+        done = finished_cells(out)
+        cells = [cell for cell in cells if cell_key(*cell) not in done]
+    if not cells:
+        return
+    sink = open(out, "a") if out else None
+    if sink and sink.tell() > 0:
+        with open(out, "rb") as f:
+            f.seek(-1, os.SEEK_END)
+            if f.read(1) != b"\n":
+                sink.write("\n")     # terminate a line cut off by an interrupted sweep
+    try:
+        with ProcessPoolExecutor(max_workers=workers or os.cpu_count()) as pool:
+            futures = [pool.submit(run_cell, config, cell_seed, cache) for config, cell_seed in cells]
+            for future in as_completed(futures):
+                record = future.result()
+                if sink:
+                    sink.write(json.dumps(record) + "\n")
+                    sink.flush()
+                yield record
+    finally:
+        sink and sink.close()
+
+def run_sweep(grid, runs=1, seed=0, out=None, workers=None, cache=None):
+    # CLI entry point; returns the process exit status
+    status = 0
+    for record in sweep(grid, runs, seed, out, workers, cache):
+        if record.get("error") or not record["completed"]:
+            status = 1
+        if not out:
+            print(json.dumps(record))
+    return status
@@ -0,0 +1,51 @@
+import os
+import shutil
+import cache
+from cache import ResultCache, cache_key, code_version, SOURCES
+from batch import simulate, CONFIG_KEYS
+from constants import probability_spec
+
+CONFIG = dict(CONFIG_KEYS, floors=6, elevators=2, people=30)
+
+def test_hit_returns_the_stored_record(tmp_path):
+    results = ResultCache(str(tmp_path / "results.sqlite"))
+    first = simulate(CONFIG, 1, cache=results)
+    second = simulate(CONFIG, 1, cache=results)
+    assert "cached" not in first and second.pop("cached")
+    assert second == first
+    assert "cached" not in simulate(CONFIG, 2, cache=results)
+    results.close()
+
+def test_editing_a_source_changes_the_version(tmp_path):
+    root = os.path.dirname(cache.__file__)
+    for name in SOURCES:
+        shutil.copy(os.path.join(root, name + ".py"), str(tmp_path))
+    assert code_version(str(tmp_path)) == code_version()
+    with open(str(tmp_path / "dispatch.py"), "a") as f:
+        f.write("\n# tuned\n")
+    assert code_version(str(tmp_path)) != code_version()
+
+def test_key_covers_the_version_and_the_probability_table(monkeypatch):
+    key = cache_key(CONFIG, 1)
+    assert cache_key(CONFIG, 1) == key and cache_key(CONFIG, 2) != key
+    monkeypatch.setattr(cache, "VERSION", "edited")
+    assert cache_key(CONFIG, 1) != key
+    monkeypatch.undo()
+    def lobby_heavy(floors):
+        spec = probability_spec(floors)
+        spec['probability'][0]['probability'] = 0.9
+        return spec
+    monkeypatch.setattr(cache, "probability_spec", lobby_heavy)
+    assert cache_key(CONFIG, 1) != key
+
+def test_least_recently_used_go_first(tmp_path):
+    results = ResultCache(str(tmp_path / "results.sqlite"), max_bytes=10 ** 6)
+    record = {"padding": "x" * 1000}
+    for key in "abc":
+        results.put(key, record)
+    results.get("a")
+    results.max_bytes = 2 * results.size() // 3
+    results.put("d", record)
+    assert "a" in results and "d" in results
+    assert "b" not in results
+    results.close()
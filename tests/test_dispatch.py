@@ -0,0 +1,55 @@
+from elevator import Simulation
+from logger import SILENT
+from stops import UP, DOWN
+from constants import TRAVELLING
+
+def bank(algorithm, floors=10, cars=2):
+    sim = Simulation(floors, cars, 0, algorithm, 1, SILENT)
+    return sim.elevators.banks[0]
+
+def place(car, floor, direction=0, stops=()):
+    car.current_floor = car.target = floor
+    car.direction = direction
+    if direction:
+        car.state = TRAVELLING
+    for stop in stops:
+        car.add_to_queue(stop)
+
+def test_eta_picks_the_nearest_idle_car():
+    group = bank("eta")
+    place(group.elevators[1], 8)
+    group.call(7, DOWN)
+    assert 7 in group.elevators[1].queue and 7 not in group.elevators[0].queue
+    assert (7, DOWN) in group.queued
+
+def test_eta_prefers_a_car_passing_on_its_way():
+    group = bank("eta")
+    near, passing = group.elevators
+    place(near, 4, UP, [9])                   # going up past the call, then back
+    place(passing, 2, UP, [9])                # the call is on its way up
+    group.call(3, DOWN)
+    assert 3 in near.queue                    # down calls wait for the turnaround either way
+    group.call(5, UP)
+    assert 5 in near.queue and 5 not in passing.queue
+    group.call(3, UP)
+    assert 3 in passing.queue                 # behind `near`: a whole sweep away
+
+def test_eta_skips_full_cars():
+    group = bank("eta")
+    full, other = group.elevators
+    place(other, 9)
+    full.load = full.capacity
+    group.call(2, UP)
+    assert 2 in other.queue and 2 not in full.queue
+
+def test_eta_rows_follow_the_cars():
+    group = bank("eta")
+    table = group.strategy.table
+    car = group.elevators[0]
+    id = table.row(car)
+    before = table.eta(id, 9, DOWN, 0)
+    place(car, 1, UP, [5])
+    table.row(car)
+    # the car now stops at 5 on the way, doors and all
+    assert table.bits[id] == car.queue.all
+    assert table.eta(id, 9, DOWN, 0) == before + table.dwell[id]
@@ -0,0 +1,47 @@
+import csv
+import pytest
+from batch import simulate, CONFIG_KEYS
+from export import Exporter, TRIPS, EVENTS
+
+CONFIG = dict(CONFIG_KEYS, floors=8, elevators=2, people=50)
+
+def export(tmp_path, fmt):
+    exporter = Exporter(str(tmp_path / "run"), fmt)
+    record = simulate(CONFIG, 1, exporter=exporter)
+    assert record["completed"]
+    return record, exporter.paths
+
+def check(record, events, trips):
+    # every finished trip ends with exactly one final ride
+    assert list(events) == [name for name, _ in EVENTS] and list(trips) == [name for name, _ in TRIPS]
+    assert sum(trips['final']) == record["metrics"]["trips"]
+    assert len(trips['passenger']) >= record["metrics"]["trips"]
+    assert all(board <= alight for board, alight in zip(trips['board'], trips['alight']))
+    assert len(events['t']) > 0 and list(events['t']) == sorted(events['t'])
+
+def test_csv_round_trip(tmp_path):
+    record, paths = export(tmp_path, 'csv')
+    tables = []
+    for path, columns in zip(paths, (EVENTS, TRIPS)):
+        with open(path, newline="") as f:
+            rows = list(csv.DictReader(f))
+        parse = {'bool_': lambda value: value == "True", 'string': str, 'float64': float}
+        tables.append({name: [parse.get(kind, int)(row[name]) for row in rows] for name, kind in columns})
+    check(record, *tables)
+
+@pytest.mark.parametrize("fmt", ['parquet', 'arrow'])
+def test_columnar_round_trip(tmp_path, fmt):
+    pa = pytest.importorskip("pyarrow")
+    record, paths = export(tmp_path, fmt)
+    if fmt == 'parquet':
+        import pyarrow.parquet as pq
+        tables = [pq.read_table(path) for path in paths]
+    else:
+        tables = [pa.ipc.open_file(pa.memory_map(path)).read_all() for path in paths]
+    assert tables[1].schema.field('final').type == pa.bool_()
+    check(record, *(table.to_pydict() for table in tables))
+
+def test_columnar_needs_pyarrow(tmp_path, monkeypatch):
+    monkeypatch.setattr("export.pa", None)
+    with pytest.raises(ImportError):
+        Exporter(str(tmp_path / "run"), 'parquet')
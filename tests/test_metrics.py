@@ -0,0 +1,37 @@
+from random import Random
+import pytest
+from metrics import Histogram
+
+def test_small_values_are_exact():
+    histogram = Histogram(precision=6)
+    for value in range(128):
+        assert histogram.index(value) == value
+        assert histogram.bucket_value(value) == value
+
+def test_bucket_contains_its_values():
+    histogram = Histogram(precision=6)
+    for value in list(range(100000)) + [10 ** 9, 2 ** 40 + 12345]:
+        index = histogram.index(value)
+        # buckets are ordered, and a value is reported within 1 / half of itself
+        assert value == 0 or index >= histogram.index(value - 1)
+        assert abs(histogram.bucket_value(index) - value) <= value / histogram.half
+
+def test_percentiles_within_precision():
+    rng = Random(3)
+    values = [int(rng.expovariate(1 / 40000.0)) for _ in range(20000)]
+    histogram = Histogram()
+    for value in values:
+        histogram.add(value)
+    values.sort()
+    for q in (50, 95, 99):
+        exact = values[max(1, int(q / 100.0 * len(values) + 0.5)) - 1]
+        assert histogram.percentile(q) == pytest.approx(exact, rel=1.0 / histogram.half)
+    assert histogram.percentile(100) == values[-1]
+    assert histogram.percentile(0) == values[0]
+    assert histogram.mean() == pytest.approx(sum(values) / len(values))
+
+def test_empty_and_negative():
+    histogram = Histogram()
+    assert histogram.percentile(50) is None and histogram.mean() is None
+    with pytest.raises(ValueError):
+        histogram.add(-1)
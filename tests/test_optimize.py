@@ -0,0 +1,37 @@
+from optimize import optimize, fleet_size, Candidate
+from batch import CONFIG_KEYS
+
+GRID = {'floors': [8], 'elevators': [1, 2, 3, 4], 'people': [60], 'algorithm': ['fcfs']}
+
+def record(wait):
+    return {"completed": True, "metrics": {"wait": {"mean": wait, "p95": wait}, "ride": {"mean": 1.0}, "utilization": [0.5]}}
+
+def test_fleet_size_counts_every_bank():
+    assert fleet_size(dict(CONFIG_KEYS, floors=10, elevators=3)) == 3
+    assert fleet_size(dict(CONFIG_KEYS, floors=10, banks="2:1-5;3:1,6-9")) == 5
+
+def test_fewest_cars_meeting_the_sla_rank_first():
+    small, large, failing = (Candidate(dict(CONFIG_KEYS, elevators=count)) for count in (2, 4, 1))
+    small.add(record(40000), "wait_p95")
+    large.add(record(10000), "wait_p95")
+    failing.add({"completed": False}, "wait_p95")
+    ranked = sorted([large, failing, small], key=lambda candidate: candidate.rank(45000))
+    assert ranked == [small, large, failing]
+    # with a tighter SLA only the large fleet meets it
+    assert sorted([small, large], key=lambda candidate: candidate.rank(20000)) == [large, small]
+
+def test_successive_halving():
+    rungs = []
+    summary = optimize(GRID, sla=10 ** 9, eta=2, rungs=3, workers=2, progress=rungs.append)
+    # 4 candidates x 1 run, the best 2 up to 2 runs, the best one up to 4
+    assert [(rung["candidates"], rung["replications"]) for rung in rungs] == [(4, 1), (2, 2), (1, 4)]
+    assert summary["runs"] == 4 + 2 + 2
+    assert summary["feasible"] and summary["best"]["cars"] == 1
+    assert summary["best"]["metric"]["n"] == 4
+
+def test_nothing_meets_the_sla():
+    summary = optimize(GRID, sla=0, eta=2, rungs=2, workers=2)
+    assert not summary["feasible"] and len(summary["finalists"]) == 2
+    # the closest candidate leads: the best metric among them
+    means = [finalist["metric"]["mean"] for finalist in summary["finalists"]]
+    assert means == sorted(means)
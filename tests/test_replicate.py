@@ -0,0 +1,45 @@
+import statistics
+import pytest
+import replicate as replicate_module
+from batch import CONFIG_KEYS
+from replicate import replicate, measure, critical, Running
+
+def test_runs_without_trips_count_as_failed():
+    # nobody travels, so there is no mean wait to replicate
+    config = dict(CONFIG_KEYS, floors=5, elevators=1, people=0)
+    summary = replicate(config, seed=1, min_runs=2, max_runs=3, workers=1)
+    assert summary["replications"] == 0 and summary["failed"] == 3
+    assert not summary["converged"]
+    assert summary["metrics"]["wait_mean"]["n"] == 0
+
+def test_measure_skips_failed_runs():
+    assert measure({"config": {}, "seed": 0, "error": "ValueError()"}) is None
+    assert measure({"completed": False}) is None
+
+CONFIG = dict(CONFIG_KEYS, floors=6, elevators=2, people=40)
+
+def test_running_matches_the_sample_statistics():
+    values = [3.0, 7.5, 1.25, 9.0, 4.0, 6.5]
+    stat = Running()
+    for value in values:
+        stat.add(value)
+    assert stat.mean == pytest.approx(statistics.mean(values))
+    assert stat.variance() == pytest.approx(statistics.variance(values))
+
+def test_critical_value_without_scipy(monkeypatch):
+    monkeypatch.setattr(replicate_module, "student_t", None)
+    assert critical(0.95, 10) == pytest.approx(2.228, rel=0.01)
+    assert critical(0.95, 3) == pytest.approx(3.182, rel=0.01)
+
+def test_stops_once_converged():
+    summary = replicate(CONFIG, seed=1, tolerance=10.0, min_runs=3, max_runs=20, workers=2)
+    assert summary["converged"] and summary["replications"] == 3
+
+def test_stops_at_the_budget():
+    summary = replicate(CONFIG, seed=1, tolerance=1e-9, min_runs=3, max_runs=5, workers=2)
+    assert not summary["converged"] and summary["replications"] == 5
+
+def test_outcome_does_not_depend_on_the_workers():
+    one = replicate(CONFIG, seed=1, tolerance=0.2, min_runs=3, max_runs=12, workers=1)
+    many = replicate(CONFIG, seed=1, tolerance=0.2, min_runs=3, max_runs=12, workers=4)
+    assert one == many
@@ -0,0 +1,63 @@
+import json
+import asyncio
+from server import Server, Viewer, delta, merge
+
+def test_merged_deltas_apply_as_one():
+    old = {"t": 0, "cars": {"0": {"floor": 1, "load": 0}, "1": {"floor": 1, "load": 0}}}
+    mid = {"t": 5, "cars": {"0": {"floor": 2, "load": 0}, "1": {"floor": 1, "load": 3}}}
+    new = {"t": 9, "cars": {"0": {"floor": 2, "load": 1}, "1": {"floor": 4, "load": 3}}}
+    update = merge(delta(old, mid), delta(mid, new))
+    assert merge(json.loads(json.dumps(old)), update) == new
+
+def test_slow_viewer_gets_merged_frames():
+    # nothing is sent until the viewer's socket drains, so frames pile up into one
+    viewer = Viewer(writer=None)
+    for t in range(3):
+        viewer.push({"t": t, "cars": {str(t): {"floor": t}}})
+    assert viewer.merged == 2
+    assert viewer.pending == {"t": 2, "cars": {"0": {"floor": 0}, "1": {"floor": 1}, "2": {"floor": 2}}}
+
+async def request(port, method, target):
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    writer.write("{} {} HTTP/1.1\r\nHost: test\r\n\r\n".format(method, target).encode())
+    await writer.drain()
+    status = int((await reader.readline()).split()[1])
+    while (await reader.readline()) != b"\r\n":
+        pass
+    body = await reader.read()
+    writer.close()
+    return status, body.decode()
+
+def test_stream_reaches_the_final_state():
+    async def scenario():
+        app = Server()
+        server = await asyncio.start_server(app.handle, "127.0.0.1", 0)
+        port = server.sockets[0].getsockname()[1]
+        async with server:
+            status, body = await request(port, "POST", "/sims?floors=6&elevators=2&people=40&seed=3&speed=0&rate=50")
+            assert status == 201 and json.loads(body)["id"] == 0
+            # the stream is the full state, then deltas, the last one marked done
+            status, body = await request(port, "GET", "/sims/0/stream")
+            assert status == 200
+            seen = {}
+            frames = [json.loads(line[len("data: "):]) for line in body.split("\n") if line.startswith("data: ")]
+            for frame in frames:
+                merge(seen, frame)
+            assert frames[-1]["done"] and seen["done"]
+            status, body = await request(port, "GET", "/sims/0")
+            assert status == 200 and json.loads(body) == seen
+            assert seen["metrics"]["trips"] > 0 and seen["inside"] == 0
+            status, body = await request(port, "GET", "/sims")
+            assert [sim["done"] for sim in json.loads(body)] == [True]
+    asyncio.run(scenario())
+
+def test_errors():
+    async def scenario():
+        app = Server()
+        server = await asyncio.start_server(app.handle, "127.0.0.1", 0)
+        port = server.sockets[0].getsockname()[1]
+        async with server:
+            assert (await request(port, "POST", "/sims?floors=ten"))[0] == 400
+            assert (await request(port, "POST", "/sims?profile=missing.npy"))[0] == 400
+            assert (await request(port, "GET", "/sims/7"))[0] == 404
+    asyncio.run(scenario())
@@ -0,0 +1,11 @@
+import pytest
+from batch import simulate, CONFIG_KEYS
+from dispatch import STRATEGIES
+
+@pytest.mark.parametrize("algorithm", sorted(STRATEGIES))
+def test_every_strategy_delivers_everyone(algorithm):
+    # within a budget: a run that livelocks (e.g. on a call taken by car 0
+    # being mistaken for an unhandled one) never completes
+    config = dict(CONFIG_KEYS, floors=10, elevators=2, people=200, algorithm=algorithm)
+    record = simulate(config, 1, max_events=200000)
+    assert record["completed"]
@@ -0,0 +1,60 @@
+import json
+import pytest
+from elevator import Simulation
+from logger import SILENT
+from export import Exporter
+from profiling import Profiler
+from snapshot import Snapshots, dumps, loads, save, load, fork
+
+def new_sim():
+    return Simulation(12, 3, 600, "eta", 4, SILENT, profile="up-peak")
+
+def run_until(sim, until):
+    # a run stopped part way, as a live simulation would be
+    sim.building.simulate()
+    sim.events.run(until=until)
+
+def summary(sim):
+    return json.dumps(sim.metrics.summary(sim.events.now()), sort_keys=True)
+
+def test_resume_is_identical(tmp_path):
+    whole = new_sim()
+    Snapshots(whole, 600000, str(tmp_path / "s-{t}.snap")).start()
+    whole.run()
+    resumed = load(str(tmp_path / "s-1800.snap"))
+    assert resumed.events.now() == 1800000
+    resumed.run()
+    assert summary(resumed) == summary(whole)
+    assert list(resumed.passengers.destination) == list(whole.passengers.destination)
+
+def test_fork_switches_algorithm_and_keeps_its_own_files(tmp_path):
+    sim = new_sim()
+    Snapshots(sim, 600000, str(tmp_path / "s-{t}.snap")).start()
+    run_until(sim, 1200000)
+    data = dumps(sim)
+    branch = fork(data, "fcfs")
+    assert branch.config["algorithm"] == "fcfs"
+    assert all(bank.strategy.name == "fcfs" for bank in branch.elevators.banks)
+    branch.run()
+    assert branch.building.inside == 0
+    assert (tmp_path / "s-1800-fcfs.snap").exists()
+    assert not (tmp_path / "s-1800.snap").exists()
+    assert loads(data).config["algorithm"] == "eta"
+
+def test_instrumented_runs_snapshot_without_their_instruments(tmp_path):
+    sim = new_sim()
+    exporter = Exporter(str(tmp_path / "ex"), "csv")
+    exporter.attach(sim)
+    profiler = Profiler("cprofile")
+    profiler.attach(sim)
+    run_until(sim, 600000)
+    path = save(sim, str(tmp_path / "s.snap"))
+    exporter.close()
+    profiler.detach()
+    assert not (tmp_path / "s.snap.tmp").exists()
+    restored = load(path)
+    assert restored.run() > 0 and restored.building.inside == 0
+
+def test_rejects_other_files():
+    with pytest.raises(ValueError):
+        loads(b"not a snapshot")
@@ -0,0 +1,83 @@
+from random import Random
+from stops import StopQueue, lowest, highest, span, UP, DOWN, CABIN
+
+def reference_next_stop(stops, current, direction):
+    # next_stop() spelled out over plain sets
+    cabin, up, down = stops
+    every = cabin | up | down
+    if not every:
+        return None
+    if current in every:
+        return current
+    if direction == 0:
+        return min(every, key=lambda floor: (abs(floor - current), floor < current))
+    for heading in (direction, -direction):
+        if heading == UP:
+            ahead = [floor for floor in cabin | up if floor > current]
+            if ahead:
+                return min(ahead)
+            turn = [floor for floor in down if floor > current]
+            if turn:
+                return max(turn)
+        else:
+            ahead = [floor for floor in cabin | down if floor < current]
+            if ahead:
+                return max(ahead)
+            turn = [floor for floor in up if floor < current]
+            if turn:
+                return min(turn)
+    return None
+
+def test_bit_helpers():
+    assert lowest(0b101000) == 3
+    assert highest(0b101000) == 5
+    assert span(0b1011010, 1, 4) == 3
+
+def test_add_clear_and_count():
+    stops = StopQueue()
+    stops.add(3)
+    stops.add(3, UP)
+    stops.add(7, DOWN)
+    assert len(stops) == 2 and 3 in stops and 7 in stops and 5 not in stops
+    assert list(stops) == [3, 7]
+    stops.clear(3)
+    stops.clear(3)
+    assert len(stops) == 1 and list(stops) == [7]
+    assert not stops.up and not stops.cabin
+
+def test_look_order():
+    stops = StopQueue()
+    stops.add(8)
+    stops.add(5, DOWN)
+    stops.add(9, DOWN)
+    stops.add(2, UP)
+    # going up: the cabin call first, then turn at the highest down call
+    assert stops.next_stop(4, UP) == 8
+    stops.clear(8)
+    assert stops.next_stop(4, UP) == 9
+    # going down from 6: the down call below, then the lowest up call
+    assert stops.next_stop(6, DOWN) == 5
+    stops.clear(5)
+    assert stops.next_stop(6, DOWN) == 2
+
+def test_should_reverse():
+    stops = StopQueue()
+    stops.add(2)
+    assert stops.should_reverse(5, UP)
+    assert not stops.should_reverse(5, DOWN)
+    assert not stops.should_reverse(5, 0)
+
+def test_next_stop_matches_reference():
+    rng = Random(7)
+    for _ in range(2000):
+        floors = rng.randint(2, 70)
+        queue = StopQueue()
+        sets = (set(), set(), set())
+        for _ in range(rng.randint(0, 6)):
+            floor = rng.randrange(floors)
+            direction = rng.choice((CABIN, UP, DOWN))
+            queue.add(floor, direction)
+            sets[(CABIN, UP, DOWN).index(direction)].add(floor)
+        current = rng.randrange(floors)
+        direction = rng.choice((UP, DOWN, 0))
+        assert queue.next_stop(current, direction) == reference_next_stop(sets, current, direction)
@@ -0,0 +1,45 @@
+import json
+import numpy as np
+import pytest
+from constants import probability_spec, STAR_FLOOR
+from traffic import load_profile, ProfileTrips, HOUR
+
+def test_probability_weights_are_squared():
+    # 0.2 / (floors - 1) ** 2 * (x - 1) * (floors - x), not the XOR 0.2 / ((floors - 1) ^ 2)
+    weights = {p['value']: p['probability'] for p in probability_spec(5)['probability']}
+    assert weights[1] == 0.8
+    assert weights[3] == pytest.approx(0.05)
+    assert weights[2] == weights[4] == pytest.approx(0.0375)
+
+def test_profile_segments_are_sorted(tmp_path):
+    path = str(tmp_path / "day.json")
+    with open(path, "w") as f:
+        json.dump([{"start": 12, "end": 13, "rate": 1, "od": "lunch"}, {"start": 8, "end": 9, "rate": 2, "od": "up"}], f)
+    assert load_profile(path) == [(8, 9, 2, "up"), (12, 13, 1, "lunch")]
+
+def test_overlapping_segments_are_rejected(tmp_path):
+    path = str(tmp_path / "day.json")
+    with open(path, "w") as f:
+        json.dump([{"start": 8, "end": 10, "rate": 1, "od": "up"}, {"start": 9, "end": 11, "rate": 1, "od": "down"}], f)
+    with pytest.raises(ValueError):
+        load_profile(path)
+
+def test_office_day_streams_in_order():
+    floors, people = 12, 20000
+    source = ProfileTrips.from_profile('office', floors, people, seed=4)
+    chunks = []
+    while True:
+        chunk = source.next_chunk(people - sum(len(c) for c in chunks), 3000)
+        if chunk is None:
+            break
+        chunks.append(chunk.copy())
+    trips = np.concatenate(chunks)
+    assert len(trips) == people
+    assert np.all(np.diff(trips['time']) >= 0)
+    assert trips['time'][0] >= 0 and trips['time'][-1] <= 24 * HOUR
+    assert np.all(trips['origin'] != trips['destination'])
+    assert np.all((trips['origin'] >= 1) & (trips['destination'] >= 1) & (trips['destination'] < floors))
+    # the morning up-peak starts at the lobby and carries a good share of the day
+    morning = trips[(trips['time'] >= 7 * HOUR) & (trips['time'] < 9.5 * HOUR)]
+    assert np.all(morning['origin'] == STAR_FLOOR)
+    assert len(morning) > people / 4
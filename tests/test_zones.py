@@ -0,0 +1,38 @@
+import pytest
+from zones import parse_floors, parse_banks, Routes
+from batch import simulate, CONFIG_KEYS
+
+def test_parse():
+    assert parse_floors("1,3-5") == {1, 3, 4, 5}
+    assert parse_banks("", 10, 3) == [(3, list(range(1, 10)))]
+    assert parse_banks("2:1-5;3:1,6-9", 10, 0) == [(2, [1, 2, 3, 4, 5]), (3, [1, 6, 7, 8, 9])]
+
+@pytest.mark.parametrize("spec", ["2:1-5", "0:1-9", "2:1-10", "two:1-9"])
+def test_bad_specs(spec):
+    with pytest.raises(ValueError):
+        parse_banks(spec, 10, 2)
+
+def test_direct_and_lobby_transfer():
+    # low-rise 1-20, express high-rise 1,21-39
+    routes = Routes([list(range(1, 21)), [1] + list(range(21, 40))], 40)
+    assert routes.hop(1, 30) == (1, 30)
+    assert routes.hop(5, 12) == (0, 12)
+    assert routes.hop(5, 30) == (0, 1)            # down to the lobby, then the express bank
+    assert routes.hop(30, 5) == (1, 1)
+
+def test_sky_lobby():
+    # shuttle 1 <-> 30, local zone 30-59, and a low zone 1-29
+    routes = Routes([[1, 30], list(range(30, 60)), list(range(1, 30))], 60)
+    assert routes.hop(1, 45) == (0, 30)
+    assert routes.hop(30, 45) == (1, 45)
+    assert routes.hop(10, 45) == (2, 1)           # three legs: low zone, shuttle, local
+    assert routes.hop(45, 10) == (1, 30)
+
+def test_unreachable():
+    with pytest.raises(ValueError):
+        Routes([[1, 2, 3], [4, 5]], 6)
+
+def test_transfers_deliver_everyone():
+    config = dict(CONFIG_KEYS, floors=30, people=500, algorithm="fcfs", banks="2:1,15;2:15-29;2:1-14")
+    record = simulate(config, 2, max_events=500000)
+    assert record["completed"]
@@ -0,0 +1,154 @@
+import os
+import csv
+import struct
+import hashlib
+import numpy as np
+from trips import TRIP_DTYPE, CHUNK_SIZE
+
+# Arrival traces are .npy files of TRIP_DTYPE rows (time ms, origin, destination)
+# in time order, so they load with np.load and replay through a memory map.
+
+def header(count):
+    # .npy v1.0 header for `count` trips, padded to a fixed length so the
+    # writer can reserve it up front and fill in the count at the end
+    text = "{{'descr': {!r}, 'fortran_order': False, 'shape': ({},), }}".format(
+        np.lib.format.dtype_to_descr(TRIP_DTYPE), str(count).rjust(20))
+    length = 10 + len(text) + 1
+    text += " " * (-length % 64) + "\n"
+    return np.lib.format.magic(1, 0) + struct.pack("<H", len(text)) + text.encode("latin1")
+
+class TraceWriter(object):
+    # Streams trips into a trace file; chunks go straight to disk, so a trace
+    # can be far larger than memory
+    def __init__(self, path):
+        self.path = path
+        self.file = open(path, "wb")
+        self.file.write(header(0))
+        self.count = 0
+        self.time = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def write(self, trips):
+        trips = np.asarray(trips)
+        if trips.dtype != TRIP_DTYPE:
+            converted = np.empty(len(trips), dtype=TRIP_DTYPE)
+            for name in TRIP_DTYPE.names:
+                converted[name] = trips[name]
+            trips = converted
+        if not len(trips):
+            return
+        times = trips['time']
+        if (self.time is not None and times[0] < self.time) or (np.diff(times) < 0).any():
+            raise ValueError("Trace trips must be written in time order")
+        self.time = times[-1]
+        self.file.write(trips.tobytes())
+        self.count += len(trips)
+
+    def close(self):
+        if self.file is None:
+            return
+        self.file.seek(0)
+        self.file.write(header(self.count))
+        self.file.close()
+        self.file = None
+
+def record_trace(path, source, people, size=CHUNK_SIZE):
+    # Write the first `people` trips of an arrival source (see traffic.trip_source)
+    with TraceWriter(path) as writer:
+        while writer.count < people:
+            chunk = source.next_chunk(people - writer.count, size)
+            if chunk is None:
+                break
+            writer.write(chunk)
+    return writer.count
+
+def convert_csv(src, path, size=CHUNK_SIZE):
+    # Turn a time,origin,destination CSV (time in ms, rows in time order, an
+    # optional header line) into a trace, a chunk of rows at a time
+    with open(src, newline="") as f, TraceWriter(path) as writer:
+        chunk = np.empty(size, dtype=TRIP_DTYPE)
+        n = 0
+        for row in csv.reader(f):
+            if not row:
+                continue
+            try:
+                time = float(row[0])
+            except ValueError:
+                if n or writer.count:
+                    raise
+                continue                  # header line
+            chunk[n] = (time, int(row[1]), int(row[2]))
+            n += 1
+            if n == size:
+                writer.write(chunk)
+                n = 0
+        writer.write(chunk[:n])
+    return writer.count
+
+def open_trace(path):
+    # Memory-mapped view of a trace; rows are only read when touched
+    trips = np.load(path, mmap_mode='r')
+    if trips.dtype != TRIP_DTYPE:
+        raise ValueError("{} is not an arrival trace (dtype {})".format(path, trips.dtype))
+    return trips
+
+# (path, size, mtime_ns) -> fingerprint, so each process reads a trace once
+FINGERPRINTS = {}
+
+def fingerprint(path):
+    # Content identity of a trace for cache keys: a hash of the whole file,
+    # streamed a MiB at a time and remembered until the file changes
+    stat = os.stat(path)
+    key = (os.path.abspath(path), stat.st_size, stat.st_mtime_ns)
+    found = FINGERPRINTS.get(key)
+    if found is None:
+        digest = hashlib.sha256()
+        with open(path, "rb") as f:
+            for block in iter(lambda: f.read(1 << 20), b""):
+                digest.update(block)
+        found = FINGERPRINTS[key] = {"trace": os.path.basename(path), "size": stat.st_size, "sha256": digest.hexdigest()}
+    return dict(found)
+
+class TraceTrips(object):
+    # Arrival source replaying a trace, a chunk at a time off the memory map.
+    # Several simulations may share one mapped array.
+    def __init__(self, trips, floors=None):
+        self.path = trips if isinstance(trips, str) else None
+        self.trips = open_trace(trips) if isinstance(trips, str) else trips
+        self.floors = floors
+        self.position = 0
+
+    def __len__(self):
+        return len(self.trips)
+
+    def __getstate__(self):
+        # a trace opened from a file is mapped again instead of copied into snapshots
+        state = self.__dict__.copy()
+        if self.path:
+            state['trips'] = None
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        if self.path:
+            self.trips = open_trace(self.path)
+
+    def next_chunk(self, remaining, size=CHUNK_SIZE):
+        count = min(size, remaining, len(self.trips) - self.position)
+        if count <= 0:
+            return None
+        chunk = np.array(self.trips[self.position:self.position + count])
+        if self.position and chunk['time'][0] < self.trips['time'][self.position - 1] or (np.diff(chunk['time']) < 0).any():
+            raise ValueError("Trace is not in time order near row {}".format(self.position))
+        origins, destinations = chunk['origin'], chunk['destination']
+        if (origins == destinations).any():
+            raise ValueError("Trace has a trip to its own floor near row {}".format(self.position))
+        if self.floors and (min(origins.min(), destinations.min()) < 1 or max(origins.max(), destinations.max()) >= self.floors):
+            raise ValueError("Trace has floors outside 1..{} near row {}".format(self.floors - 1, self.position))
+        self.position += count
+        return chunk
@@ -0,0 +1,180 @@
+import json
+import numpy as np
+from trips import TripGenerator, TRIP_DTYPE, CHUNK_SIZE
+from constants import STAR_FLOOR
+from traces import TraceTrips, fingerprint
+
+HOUR = 3600 * 1000                        # ms
+
+# O/D patterns over floors 1..floors-1 (the floors of probability_spec):
+# weights[origin, destination], floor 0 unused and no trip to the same floor
+def up_peak(floors):
+    weights = np.zeros((floors, floors))
+    weights[STAR_FLOOR, 1:] = 1.0
+    weights[STAR_FLOOR, STAR_FLOOR] = 0.0
+    return weights
+
+def down_peak(floors):
+    return up_peak(floors).T.copy()
+
+def interfloor(floors):
+    weights = np.zeros((floors, floors))
+    upper = [x for x in range(1, floors) if x != STAR_FLOOR]
+    for origin in upper:
+        weights[origin, upper] = 1.0
+        weights[origin, origin] = 0.0
+    return weights
+
+def normalized(weights):
+    total = weights.sum()
+    return weights / total if total else weights
+
+def lunch(floors):
+    return 0.45 * normalized(up_peak(floors)) + 0.45 * normalized(down_peak(floors)) + 0.1 * normalized(interfloor(floors))
+
+def night(floors):
+    return 0.7 * normalized(down_peak(floors)) + 0.3 * normalized(interfloor(floors))
+
+PATTERNS = {
+    'up': up_peak,
+    'down': down_peak,
+    'interfloor': interfloor,
+    'lunch': lunch,
+    'night': night,
+}
+
+# Built-in profiles: (start hour, end hour, relative arrival rate, O/D pattern)
+PROFILES = {
+    'office': [
+        (0, 7, 0.02, 'night'),
+        (7, 9.5, 1.0, 'up'),
+        (9.5, 12, 0.15, 'interfloor'),
+        (12, 13.5, 0.6, 'lunch'),
+        (13.5, 16.5, 0.15, 'interfloor'),
+        (16.5, 18.5, 0.9, 'down'),
+        (18.5, 24, 0.03, 'night'),
+    ],
+    'up-peak': [(0, 1, 1.0, 'up')],
+    'lunch': [(0, 1, 1.0, 'lunch')],
+    'down-peak': [(0, 1, 1.0, 'down')],
+}
+
+STATIC = "static"                         # the historical lobby arrivals of TripGenerator
+
+class Segment(object):
+    # A stretch of the day with a constant arrival rate and one O/D matrix
+    def __init__(self, start, end, rate, weights):
+        if end <= start or rate < 0:
+            raise ValueError("Segment needs start < end and a non-negative rate, got {}-{} at {}".format(start, end, rate))
+        weights = np.asarray(weights, dtype=float)
+        self.start = start                # ms
+        self.end = end
+        self.rate = rate
+        self.cdf = np.cumsum(weights.ravel())
+        if rate and not self.cdf[-1] > 0:
+            raise ValueError("Segment {}-{} has arrivals but no trips in its O/D matrix".format(start, end))
+        self.cdf /= self.cdf[-1] or 1.0
+        self.width = weights.shape[1]
+
+    def mass(self):
+        return self.rate * (self.end - self.start)
+
+def resolve(weights, floors):
+    # a pattern name or an explicit floors x floors matrix
+    if isinstance(weights, str):
+        if weights not in PATTERNS:
+            raise ValueError("O/D pattern {} is not supported".format(weights))
+        return PATTERNS[weights](floors)
+    weights = np.asarray(weights, dtype=float)
+    if weights.shape != (floors, floors):
+        raise ValueError("O/D matrix must be {0}x{0}, got {1}".format(floors, weights.shape))
+    np.fill_diagonal(weights, 0.0)
+    return weights
+
+def load_profile(name):
+    # Segments of a built-in profile, or of a JSON file holding
+    # [{"start": h, "end": h, "rate": r, "od": pattern or matrix}, ...] (hours),
+    # in any order but not overlapping; arrivals are generated in time order
+    if name in PROFILES:
+        return PROFILES[name]
+    if not name.endswith(".json"):
+        raise ValueError("Traffic profile {} is not supported".format(name))
+    with open(name) as f:
+        segments = sorted(((x['start'], x['end'], x['rate'], x['od']) for x in json.load(f)), key=lambda x: (x[0], x[1]))
+    for before, after in zip(segments, segments[1:]):
+        if after[0] < before[1]:
+            raise ValueError("Traffic profile {}: segments {}-{} and {}-{} overlap".format(name, before[0], before[1], after[0], after[1]))
+    return segments
+
+def is_trace(name):
+    return name.endswith(".npy")
+
+def describe(name):
+    # What a profile name stands for, for cache keys
+    if name == STATIC:
+        return name
+    return fingerprint(name) if is_trace(name) else load_profile(name)
+
+class ProfileTrips(object):
+    # Trips of `people` passengers spread over a profile's day as a
+    # non-homogeneous Poisson process (conditioned on the total): each
+    # segment's share is drawn once, then its arrival times are produced in
+    # order, chunk by chunk, as descending uniform order statistics
+    # (U(j) = U(j+1) * V^(1/j), summed in log space), so nothing is
+    # materialized up front and no draw is rejected.
+    def __init__(self, segments, people, seed=None):
+        self.segments = segments
+        self.rng = np.random.default_rng(seed)
+        mass = np.array([segment.mass() for segment in segments])
+        if not mass.sum() > 0:
+            raise ValueError("Traffic profile has no arrivals")
+        self.counts = self.rng.multinomial(people, mass / mass.sum()).tolist()
+        self.segment = 0
+        self.left = self.counts[0]        # arrivals still to draw in the current segment
+        self.log_u = 0.0                  # log of the last order statistic drawn
+
+    @classmethod
+    def from_profile(cls, name, floors, people, seed=None):
+        segments = [Segment(start * HOUR, end * HOUR, rate, resolve(od, floors)) for start, end, rate, od in load_profile(name)]
+        return cls(segments, people, seed)
+
+    def generate(self, count, out=None):
+        if out is None:
+            out = np.empty(count, dtype=TRIP_DTYPE)
+        filled = 0
+        while filled < count:
+            if self.left == 0:
+                if self.segment + 1 == len(self.segments):
+                    break
+                self.segment += 1
+                self.left = self.counts[self.segment]
+                self.log_u = 0.0
+                continue
+            segment = self.segments[self.segment]
+            m = min(count - filled, self.left)
+            order = np.arange(self.left, self.left - m, -1)
+            logs = self.log_u + np.cumsum(np.log1p(-self.rng.random(m)) / order)
+            self.log_u = float(logs[-1])
+            self.left -= m
+            part = out[filled:filled + m]
+            part['time'] = segment.start + (segment.end - segment.start) * -np.expm1(logs)
+            pairs = np.minimum(np.searchsorted(segment.cdf, self.rng.random(m), side='right'), len(segment.cdf) - 1)
+            part['origin'] = pairs // segment.width
+            part['destination'] = pairs % segment.width
+            filled += m
+        return out[:filled]
+
+    def next_chunk(self, remaining, size=CHUNK_SIZE):
+        if remaining <= 0:
+            return None
+        chunk = self.generate(min(size, remaining))
+        return chunk if len(chunk) else None
+
+def trip_source(profile, spec, floors, people, seed=None):
+    # Arrival stream of a run: TripGenerator for the static lobby arrivals,
+    # TraceTrips replaying a recorded .npy trace, ProfileTrips for a traffic profile
+    if profile == STATIC:
+        return TripGenerator(spec, seed, origin=STAR_FLOOR)
+    if is_trace(profile):
+        return TraceTrips(profile, floors)
+    return ProfileTrips.from_profile(profile, floors, people, seed)
@@ -0,0 +1,127 @@
+import numpy as np
+
+# One passenger trip: arrival time (ms of virtual time), origin and destination floor
+TRIP_DTYPE = np.dtype([
+    ('time', 'f8'),
+    ('origin', 'i4'),
+    ('destination', 'i4'),
+])
+
+CHUNK_SIZE = 4096
+
+# Dwell-time distributions: name -> parameter names (all in ms)
+DWELL_KINDS = {
+    'uniform': ('low', 'high'),
+    'gaussian': ('mean', 'sd'),
+    'exponential': ('mean',),
+}
+
+def parse_dwell(spec):
+    # "uniform:LOW:HIGH", "gaussian:MEAN:SD" or "exponential:MEAN" -> (kind, [params])
+    kind, *params = spec.split(':')
+    if kind not in DWELL_KINDS:
+        raise ValueError("Dwell distribution {} is not supported".format(kind))
+    if len(params) != len(DWELL_KINDS[kind]):
+        raise ValueError("Dwell distribution {} takes {}".format(kind, ", ".join(DWELL_KINDS[kind])))
+    params = [float(x) for x in params]
+    if min(params) < 0:
+        raise ValueError("Dwell parameters must be non-negative: {}".format(spec))
+    return kind, params
+
+class TripGenerator(object):
+    # Vectorized counterpart of Probability.rand_unique for whole populations.
+    # The CDF of the probability spec is computed once; origins are drawn with
+    # searchsorted and destinations from the spec conditioned on differing
+    # from the origin, so no draw is ever rejected. Arrival gaps follow
+    # Building's historical 0 or `gap` ms coin flip.
+    def __init__(self, prob, seed=None, origin=None, gap=1000):
+        # seed may also be a numpy Generator, which is used as is
+        values = np.array([x['value'] for x in prob['probability']], dtype=np.int32)
+        weights = np.array([float(x['probability']) for x in prob['probability']])
+        if len(values) < 2:
+            raise ValueError("Probability spec needs at least two floors to draw distinct trips")
+        self.values = values
+        self.weights = weights / weights.sum()
+        self.cdf = np.cumsum(self.weights)
+        self.cdf[-1] = 1.0
+        self.before = self.cdf - self.weights      # mass strictly below each entry
+        self.index = {int(v): i for i, v in enumerate(values)}
+        self.origin = origin
+        self.gap = gap
+        self.rng = np.random.default_rng(seed)
+        self.time = 0.0                            # arrival time of the last trip drawn
+
+    def draw_origins(self, count):
+        # Indices into self.values; -1 for a fixed origin outside the spec
+        if self.origin is not None:
+            return np.full(count, self.index.get(self.origin, -1), dtype=np.intp)
+        return np.minimum(np.searchsorted(self.cdf, self.rng.random(count), side='right'), len(self.values) - 1)
+
+    def draw_destinations(self, origins):
+        # Sample u over the mass left once the origin is removed, then step
+        # over the origin's slice of the CDF.
+        inside = origins >= 0
+        weight = np.where(inside, self.weights[origins], 0.0)
+        below = np.where(inside, self.before[origins], 0.0)
+        u = self.rng.random(len(origins)) * (1.0 - weight)
+        u += np.where(u >= below, weight, 0.0)
+        picked = np.minimum(np.searchsorted(self.cdf, u, side='right'), len(self.values) - 1)
+        # rounding at a boundary can land on the origin itself; take a neighbour
+        clash = picked == origins
+        if clash.any():
+            picked[clash] = np.where(origins[clash] == 0, 1, origins[clash] - 1)
+        return picked
+
+    def generate(self, count, out=None):
+        # Fill (or allocate) a TRIP_DTYPE array with the next `count` trips
+        if out is None:
+            out = np.empty(count, dtype=TRIP_DTYPE)
+        out = out[:count]
+        if count == 0:
+            return out
+        origins = self.draw_origins(count)
+        destinations = self.draw_destinations(origins)
+        gaps = self.rng.integers(0, 2, size=count) * float(self.gap)
+        gaps[0] += self.time
+        np.cumsum(gaps, out=out['time'])
+        self.time = float(out['time'][-1])
+        out['origin'] = self.origin if self.origin is not None else self.values[origins]
+        out['destination'] = self.values[destinations]
+        return out
+
+    def next_chunk(self, remaining, size=CHUNK_SIZE):
+        # Next block of at most `size` trips out of `remaining`, None when done
+        if remaining <= 0:
+            return None
+        return self.generate(min(size, remaining))
+
+class DwellTime(object):
+    # Time (ms) a passenger spends on a floor before their next trip. Values
+    # are drawn from the distribution in vectorized chunks and handed out one
+    # at a time; gaussian draws are clipped at 0.
+    def __init__(self, spec, seed=None, size=CHUNK_SIZE):
+        self.spec = spec
+        self.kind, self.params = parse_dwell(spec)
+        self.rng = np.random.default_rng(seed)
+        self.size = size
+        self.buffer = []
+        self.index = 0
+
+    def draw(self, count):
+        rng = self.rng
+        if self.kind == 'uniform':
+            low, high = self.params
+            return rng.uniform(low, high, count)
+        elif self.kind == 'gaussian':
+            mean, sd = self.params
+            return np.maximum(rng.normal(mean, sd, count), 0.0)
+        else:
+            return rng.exponential(self.params[0], count)
+
+    def sample(self):
+        if self.index == len(self.buffer):
+            self.buffer = self.draw(self.size).tolist()
+            self.index = 0
+        value = self.buffer[self.index]
+        self.index += 1
+        return value
@@ -0,0 +1,77 @@
+from constants import STAR_FLOOR
+
+# Elevator banks: "CARS:FLOORS;CARS:FLOORS;..." where FLOORS is a comma list
+# of floors and inclusive ranges, e.g. a low-rise and an express high-rise bank
+# over a 40-floor tower, and a sky lobby shuttle with the zone above it:
+#   "6:1-20;6:1,21-39"                  "4:1,30;6:30-59"
+# An empty spec is one bank of `elevators` cars serving every floor.
+
+def parse_floors(text):
+    floors = set()
+    for part in text.split(","):
+        low, _, high = part.strip().partition("-")
+        floors.update(range(int(low), int(high or low) + 1))
+    return floors
+
+def parse_banks(spec, floors, elevators):
+    # [(cars, sorted served floors), ...] of a bank spec; every floor
+    # 1..floors-1 must be served and reachable from every other
+    if not spec:
+        return [(elevators, list(range(1, floors)))]
+    banks = []
+    for entry in spec.split(";"):
+        cars, _, served = entry.partition(":")
+        try:
+            cars, served = int(cars), parse_floors(served)
+        except ValueError:
+            raise ValueError("Bank {} is not CARS:FLOORS".format(entry))
+        if cars < 1 or min(served) < 1 or max(served) >= floors:
+            raise ValueError("Bank {} needs at least one car and floors in 1..{}".format(entry, floors - 1))
+        banks.append((cars, sorted(served)))
+    missing = set(range(1, floors)).difference(*[served for _, served in banks])
+    if missing:
+        raise ValueError("Floors {} are not served by any bank".format(sorted(missing)))
+    return banks
+
+class Routes(object):
+    # Next leg of any trip: hop(origin, destination) is (bank, floor) -- ride
+    # bank `bank` to `floor`, which is the destination when one bank serves
+    # both ends and otherwise the transfer floor (a sky lobby) on a trip with
+    # the fewest legs. The table for a destination is built on first use by a
+    # breadth-first search over banks, so every later lookup is O(1).
+    def __init__(self, served, floors):
+        self.served = [set(zone) for zone in served]
+        self.floors = floors
+        self.tables = {}
+        self.banks_at = [[bank for bank, zone in enumerate(self.served) if floor in zone] for floor in range(floors)]
+        unreachable = [floor for floor, hop in enumerate(self.table(STAR_FLOOR)) if hop is None and floor not in (0, STAR_FLOOR)]
+        if unreachable:
+            raise ValueError("Floors {} cannot reach floor {} by any bank".format(unreachable, STAR_FLOOR))
+
+    def table(self, destination):
+        hops = self.tables.get(destination)
+        if hops is None:
+            hops = self.tables[destination] = self.search(destination)
+        return hops
+
+    def search(self, destination):
+        hops = [None] * self.floors
+        reached = [destination]
+        used = set()
+        while reached:
+            frontier = []
+            for target in reached:
+                for bank in self.banks_at[target]:
+                    if bank in used:
+                        continue
+                    used.add(bank)
+                    for floor in sorted(self.served[bank]):
+                        if hops[floor] is None and floor != destination:
+                            hops[floor] = (bank, target)
+                            frontier.append(floor)
+            # sky lobbies first: transfer at the lowest shared floor
+            reached = sorted(frontier)
+        return hops
+
+    def hop(self, origin, destination):
+        return self.table(destination)[origin]